@@ -0,0 +1,110 @@
+"""
+Adaptive question selection for LearnSphere
+Elo-style ratings on a logistic scale: each student has an ability per topic, each
+question a difficulty, and each (student, question) pair a small personal offset
+"""
+
+import math
+import random
+from bisect import bisect_left
+from typing import Container, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Starting difficulty for questions that have not been answered yet
+DIFFICULTY_RATINGS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+
+# Update step sizes: abilities move fastest, shared question ratings slowest
+ABILITY_K = 0.4
+QUESTION_K = 0.1
+OFFSET_K = 0.3
+
+
+def expected_score(ability: float, difficulty: float) -> float:
+    """Probability that a student of `ability` answers a question of `difficulty` correctly"""
+    return 1.0 / (1.0 + math.exp(difficulty - ability))
+
+
+def logit(probability: float) -> float:
+    probability = min(max(probability, 0.05), 0.95)
+    return math.log(probability / (1.0 - probability))
+
+
+def initial_difficulty(label: Optional[str]) -> float:
+    return DIFFICULTY_RATINGS.get(label or 'medium', 0.0)
+
+
+def ability_from_score(score: Optional[float]) -> float:
+    """Seed an ability from a 0-1 topic score: the level at which a medium question has that success rate"""
+    return 0.0 if score is None else logit(score)
+
+
+def elo_update(ability: float, difficulty: float, offset: float, correct: bool) -> Tuple[float, float, float]:
+    """
+    Apply one answer to the three ratings involved
+
+    Args:
+        ability: Student's ability in the question's topic
+        difficulty: Question's shared difficulty rating
+        offset: Student's personal adjustment for this question
+        correct: Whether the answer was right
+
+    Returns:
+        New (ability, difficulty, offset)
+    """
+    error = (1.0 if correct else 0.0) - expected_score(ability + offset, difficulty)
+    return ability + ABILITY_K * error, difficulty - QUESTION_K * error, offset + OFFSET_K * error
+
+
+class DifficultyIndex:
+    """Questions of each topic sorted by difficulty rating, for picking the ones nearest a target level"""
+    
+    def __init__(self, entries: Iterable[Tuple[str, Hashable, float, object]] = ()):
+        grouped: Dict[str, List[Tuple[float, Hashable, object]]] = {}
+        for topic, key, rating, item in entries:
+            grouped.setdefault(topic, []).append((rating, key, item))
+        self.ratings: Dict[str, List[float]] = {}
+        self.entries: Dict[str, List[Tuple[Hashable, object]]] = {}
+        for topic, rows in grouped.items():
+            rows.sort(key=lambda row: row[0])
+            self.ratings[topic] = [rating for rating, _, _ in rows]
+            self.entries[topic] = [(key, item) for _, key, item in rows]
+    
+    def __len__(self) -> int:
+        return sum(len(ratings) for ratings in self.ratings.values())
+    
+    def _nearest(self, topic: str, target: float, count: int, skip: Container) -> List[Tuple[float, object]]:
+        ratings = self.ratings.get(topic, [])
+        entries = self.entries.get(topic, [])
+        below = bisect_left(ratings, target) - 1
+        above = below + 1
+        found = []
+        while len(found) < count and (below >= 0 or above < len(ratings)):
+            if above >= len(ratings) or (below >= 0 and target - ratings[below] <= ratings[above] - target):
+                position, below = below, below - 1
+            else:
+                position, above = above, above + 1
+            key, item = entries[position]
+            if key not in skip:
+                found.append((ratings[position], item))
+        return found
+    
+    def pick(self, topic: str, target: float, count: int, skip: Container = (),
+             spread: int = 2, rng: random.Random = random) -> List[object]:
+        """
+        Choose questions close to a target difficulty
+    
+        Args:
+            topic: Topic to choose from
+            target: Difficulty rating to aim at
+            count: Number of questions wanted
+            skip: Keys to leave out while enough others remain
+            spread: A random `count` is drawn from the nearest `count * spread`, for variety
+            rng: Source of randomness
+    
+        Returns:
+            Up to `count` items, easiest first
+        """
+        window = self._nearest(topic, target, count * spread, skip)
+        if len(window) < count and skip:
+            window = self._nearest(topic, target, count * spread, ())
+        chosen = rng.sample(window, min(count, len(window)))
+        return [item for _, item in sorted(chosen, key=lambda pair: pair[0])]
@@ -0,0 +1,187 @@
+"""
+AI backends for LearnSphere
+The model behind AIService: Google Gemini, or a deterministic local stub for offline load tests
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+
+class AIBackend:
+    """
+    What AIService needs from a model.
+    
+    `task` names the AIService method making the call and `params` carries
+    its arguments; real models only need the prompt, the stub answers from them.
+    History turns are {'role': 'user'|'model', 'parts': [{'text': ...}]}.
+    """
+    
+    name = 'base'
+    
+    def generate(self, prompt: str, task: str, params: Optional[Dict] = None) -> str:
+        raise NotImplementedError
+    
+    def chat(self, history: List[Dict], message: str) -> str:
+        raise NotImplementedError
+    
+    def stream_chat(self, history: List[Dict], message: str) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class GeminiBackend(AIBackend):
+    """Google Gemini; the SDK is slow to import, so it is loaded on the first call rather than at startup"""
+    
+    def __init__(self, api_key: str, model_name: str = 'gemini-1.5-flash', transport: str = 'rest',
+                 timeout: float = 50):
+        self.api_key = api_key
+        self.name = model_name
+        # REST goes through the standard socket module, which gevent workers patch; gRPC would block them
+        self.transport = transport
+        # Seconds before the SDK gives up on a request, so a hung call fails instead of holding its slot
+        self.timeout = timeout
+        self._model = None
+        self._lock = threading.Lock()
+    
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key, transport=self.transport)
+                    self._model = genai.GenerativeModel(self.name)
+        return self._model
+    
+    def generate(self, prompt: str, task: str, params: Optional[Dict] = None) -> str:
+        return self.model.generate_content(prompt, request_options={'timeout': self.timeout}).text
+    
+    def _send(self, history: List[Dict], message: str, stream: bool = False):
+        # ChatSession.send_message takes no request options, so the conversation goes to generate_content
+        contents = [{'role': msg['role'], 'parts': [{'text': p['text']} for p in msg.get('parts', [])]}
+                    for msg in history]
+        contents.append({'role': 'user', 'parts': [{'text': message}]})
+        return self.model.generate_content(contents, stream=stream, request_options={'timeout': self.timeout})
+    
+    def chat(self, history: List[Dict], message: str) -> str:
+        return self._send(history, message).text
+    
+    def stream_chat(self, history: List[Dict], message: str) -> Iterator[str]:
+        for chunk in self._send(history, message, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend(AIBackend):
+    """
+    Offline stand-in that answers every task with canned, schema-valid output.
+    
+    Output depends only on the inputs, so runs are repeatable; `latency` is
+    seconds per call (a (low, high) pair draws uniformly) and `error_rate` is
+    the chance a call raises, both drawn from a seeded generator.
+    """
+    
+    name = 'stub'
+    
+    def __init__(self, latency=0.0, error_rate: float = 0.0, seed: int = 0, chunk_words: int = 4):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chunk_words = chunk_words
+        self._random = random.Random(seed)
+    
+    @classmethod
+    def from_env(cls) -> 'StubBackend':
+        """AI_STUB_LATENCY ('0.5' or '0.2-0.8'), AI_STUB_ERROR_RATE (0-1), AI_STUB_SEED"""
+        latency = os.environ.get('AI_STUB_LATENCY', '0')
+        if '-' in latency:
+            low, high = latency.split('-', 1)
+            latency = (float(low), float(high))
+        else:
+            latency = float(latency)
+        return cls(latency=latency,
+                   error_rate=float(os.environ.get('AI_STUB_ERROR_RATE', 0)),
+                   seed=int(os.environ.get('AI_STUB_SEED', 0)))
+    
+    def _simulate(self):
+        delay = self._random.uniform(*self.latency) if isinstance(self.latency, tuple) else self.latency
+        if delay:
+            time.sleep(delay)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError('Injected stub backend failure')
+    
+    def generate(self, prompt: str, task: str, params: Optional[Dict] = None) -> str:
+        self._simulate()
+        params = params or {}
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        
+        if task == 'generate_quiz_questions':
+            return json.dumps(self._questions(params, digest))
+        
+        if task == 'generate_question_batch':
+            return json.dumps([q for spec in params.get('specs', []) for q in self._questions(spec, digest)])
+        
+        if task == 'analyze_student_performance':
+            weak_topics = params.get('weak_topics') or []
+            return json.dumps({
+                'overall_performance': f'Stub analysis {digest}: steady progress across {len(params.get("quiz_scores") or {})} topics.',
+                'recommendations': [f'Practice {t} daily' for t in weak_topics][:3] or ['Keep taking quizzes'],
+                'focus_areas': weak_topics,
+                'study_strategies': ['Spaced repetition', 'Worked examples']
+            })
+        
+        if task == 'generate_study_plan':
+            weak_topics = params.get('weak_topics') or ['Review']
+            days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+            hours = max(int(params.get('available_hours', 10)) // len(days), 1)
+            return json.dumps({
+                'weekly_schedule': [
+                    {'day': day, 'topic': weak_topics[i % len(weak_topics)], 'duration': hours,
+                     'activities': ['Review notes', 'Practice problems']}
+                    for i, day in enumerate(days)
+                ],
+                'milestones': ['Finish one quiz per topic'],
+                'tips': ['Study at the same time each day']
+            })
+        
+        return f"**Stub response {digest}.** This text stands in for the model's answer to a {task} request."
+    
+    @staticmethod
+    def _questions(spec: Dict, digest: str) -> List[Dict]:
+        topic = spec.get('topic', 'General')
+        difficulty = spec.get('difficulty', 'medium')
+        questions = []
+        for i in range(int(spec.get('count', 5))):
+            options = [f'{topic} answer {digest}-{i}-{n}' for n in ('A', 'B', 'C')]
+            questions.append({
+                'topic': topic,
+                'difficulty': difficulty,
+                'question': f'[{difficulty}] {topic} practice question {i + 1} ({digest})?',
+                'options': options,
+                'correct_answer': options[i % 3],
+                'hint': f'Review the basics of {topic}.',
+                'explanation': f'{options[i % 3]} is the stub answer for question {i + 1}.'
+            })
+        return questions
+    
+    def chat(self, history: List[Dict], message: str) -> str:
+        return ''.join(self.stream_chat(history, message))
+    
+    def stream_chat(self, history: List[Dict], message: str) -> Iterator[str]:
+        self._simulate()
+        words = (f"Stub tutor reply (turn {len(history) // 2}): let's work through "
+                 f"\"{message[:80]}\" step by step.").split(' ')
+        for i in range(0, len(words), self.chunk_words):
+            yield ' '.join(words[i:i + self.chunk_words]) + (' ' if i + self.chunk_words < len(words) else '')
+
+
+def create_backend(api_key: Optional[str] = None) -> Optional[AIBackend]:
+    """Backend chosen by AI_BACKEND ('gemini' by default, or 'stub'); None when Gemini has no key"""
+    if os.environ.get('AI_BACKEND', 'gemini').lower() == 'stub':
+        return StubBackend.from_env()
+    if not api_key:
+        return None
+    return GeminiBackend(api_key, timeout=float(os.environ.get('AI_REQUEST_TIMEOUT', 50)))
@@ -0,0 +1,139 @@
+"""
+Response cache for LearnSphere AI calls
+Persists parsed AI results in SQLite so repeated prompts skip the model
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Sentinel so a cached empty list or dict is still a hit
+MISS = object()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with a TTL, stored in a single SQLite file.
+    
+    Worker processes can share one file; each keeps its own connection and hit/miss counters.
+    """
+    
+    def __init__(self, path: str, max_entries: int = 1000, ttl: int = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._connection = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        if self.path != ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS ai_responses ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_ai_responses_last_used ON ai_responses (last_used)')
+        conn.commit()
+        return conn
+    
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not be used across fork; a worker forked after the cache was opened gets its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._connection = self._connect()
+        return self._connection
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable key for a call, e.g. make_key(method, model_name, prompt)"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Any:
+        """
+        Look up a cached result
+        
+        Args:
+            key: Key from make_key()
+            
+        Returns:
+            The cached value, or MISS if absent or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created_at FROM ai_responses WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute('DELETE FROM ai_responses WHERE key = ?', (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return MISS
+            self._conn.execute('UPDATE ai_responses SET last_used = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+    
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable result, evicting the least recently used entries past max_entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ai_responses (key, value, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now)
+            )
+            excess = self._conn.execute('SELECT COUNT(*) FROM ai_responses').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    'DELETE FROM ai_responses WHERE key IN '
+                    '(SELECT key FROM ai_responses ORDER BY last_used LIMIT ?)', (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM ai_responses')
+            self._conn.commit()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM ai_responses').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None
+        }
+
+
+# Singleton instance
+_response_cache = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the global response cache (instance/ai_cache.db by default); AI_CACHE_PATH=off disables caching"""
+    global _response_cache
+    path = os.environ.get('AI_CACHE_PATH', os.path.join('instance', 'ai_cache.db'))
+    if path.lower() == 'off':
+        return None
+    if _response_cache is None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        _response_cache = ResponseCache(
+            path,
+            max_entries=int(os.environ.get('AI_CACHE_MAX_ENTRIES', 1000)),
+            ttl=int(os.environ.get('AI_CACHE_TTL', 7 * 24 * 3600))
+        )
+    return _response_cache
@@ -0,0 +1,187 @@
+"""
+AI execution pool for LearnSphere
+Runs slow model calls on a dedicated thread pool behind per-endpoint limits
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+
+class AIPoolBusy(Exception):
+    """Raised instead of queueing indefinitely; `status` is the HTTP status to answer with"""
+    
+    def __init__(self, lane: str, status: int, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.lane = lane
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Lane:
+    """Concurrency limit for one endpoint plus a bounded count of requests waiting for a slot"""
+    
+    def __init__(self, name: str, concurrency: int, max_waiting: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.lock = threading.Lock()
+    
+    def stats(self) -> Dict:
+        return {
+            'concurrency': self.concurrency,
+            'running': self.running,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
+
+
+def fit_lanes(limits: Dict[str, int], capacity: int) -> Dict[str, int]:
+    """
+    Scale lane limits down proportionally so they add up to at most `capacity`
+    
+    Args:
+        limits: Lane name -> wanted concurrency
+        capacity: Most calls the lanes may run at once between them
+        
+    Returns:
+        Lane name -> concurrency, at least 1 each; `limits` unchanged if they already fit
+        
+    Raises:
+        ValueError: capacity leaves less than one slot per lane
+    """
+    total = sum(limits.values())
+    if total <= capacity:
+        return dict(limits)
+    if capacity < len(limits):
+        raise ValueError(f'{len(limits)} AI lanes need at least one slot each, but only {capacity} fit')
+    fitted = {name: max(1, n * capacity // total) for name, n in limits.items()}
+    while sum(fitted.values()) > capacity:
+        largest = max(fitted, key=fitted.get)
+        fitted[largest] -= 1
+    return fitted
+
+
+class AIPool:
+    """
+    Bulkhead in front of the AI service.
+    
+    Each endpoint gets its own lane, so a burst of tutor chats cannot starve
+    question generation, and the pool is sized to the sum of the lanes so a
+    call never queues inside the executor. A request gives up after
+    `queue_timeout` seconds waiting for a slot or `call_timeout` seconds
+    waiting for the model; the worker thread is then free for other requests
+    while the abandoned call keeps its slot until it finishes.
+    
+    Requests waiting on a lane still occupy one of the worker's request slots
+    (a thread, or a greenlet under gevent). Given `request_slots`, the lanes
+    are scaled down so their running and waiting requests together hold at
+    most half of them, leaving the rest for everything else.
+    
+    A call that overruns `call_timeout` may be hung rather than slow; the
+    lane name is passed to `on_timeout` so the caller can tell its circuit
+    breakers, which never hear back from a hung call.
+    """
+    
+    def __init__(self, limits: Dict[str, int], queue_factor: int = 2,
+                 queue_timeout: float = 5, call_timeout: float = 60, request_slots: Optional[int] = None,
+                 on_timeout: Optional[Callable[[str], None]] = None):
+        if request_slots is not None:
+            limits = fit_lanes(limits, request_slots // (2 * (1 + queue_factor)))
+        self.lanes = {name: Lane(name, n, n * queue_factor) for name, n in limits.items()}
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.on_timeout = on_timeout
+        self.executor = ThreadPoolExecutor(max_workers=sum(limits.values()), thread_name_prefix='learnsphere-ai')
+    
+    def run(self, lane_name: str, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the named lane and wait for its result
+        
+        Args:
+            lane_name: Endpoint lane, e.g. 'tutor'
+            fn: The AI call to make
+            
+        Returns:
+            Whatever fn returns; exceptions raised by fn propagate
+            
+        Raises:
+            AIPoolBusy: 429 when the lane's wait list is full, 503 when no slot
+                frees up within queue_timeout, 504 when the call overruns call_timeout
+        """
+        return self._call(self.acquire(lane_name), fn, *args, **kwargs)
+    
+    def run_waiting(self, lane_name: str, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the named lane, waiting as long as it takes for a slot
+        
+        For background jobs, which hold no request while they wait: the lane's
+        wait list and queue_timeout don't apply, call_timeout (504) still does.
+        """
+        lane = self.lanes[lane_name]
+        with lane.lock:
+            lane.waiting += 1
+        try:
+            lane.slots.acquire()
+        finally:
+            with lane.lock:
+                lane.waiting -= 1
+        with lane.lock:
+            lane.running += 1
+        return self._call(lane, fn, *args, **kwargs)
+    
+    def _call(self, lane: Lane, fn: Callable, *args, **kwargs):
+        """Run fn on the executor in a slot already taken in `lane`, releasing it when fn finishes"""
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release(lane)
+            raise
+        future.add_done_callback(lambda _: self.release(lane))
+        try:
+            return future.result(timeout=self.call_timeout)
+        except FutureTimeout:
+            with lane.lock:
+                lane.timed_out += 1
+            if self.on_timeout:
+                self.on_timeout(lane.name)
+            raise AIPoolBusy(lane.name, 504, 'AI service took too long to respond', retry_after=30)
+    
+    def acquire(self, lane_name: str) -> Lane:
+        """Take a slot in the named lane, raising AIPoolBusy (429/503) as run() does.
+        
+        Streamed calls hold the slot in the request thread and must release() it
+        when the response closes.
+        """
+        lane = self.lanes[lane_name]
+        with lane.lock:
+            if lane.waiting >= lane.max_waiting:
+                lane.rejected += 1
+                raise AIPoolBusy(lane_name, 429, 'Too many AI requests are queued, please retry shortly')
+            lane.waiting += 1
+        try:
+            acquired = lane.slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with lane.lock:
+                lane.waiting -= 1
+        if not acquired:
+            with lane.lock:
+                lane.timed_out += 1
+            raise AIPoolBusy(lane_name, 503, 'AI service is busy, please retry shortly')
+        with lane.lock:
+            lane.running += 1
+        return lane
+    
+    def release(self, lane: Lane):
+        with lane.lock:
+            lane.running -= 1
+        lane.slots.release()
+    
+    def stats(self) -> Dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
@@ -3,33 +3,138 @@ AI Service for LearnSphere
 Handles AI-powered question generation and content analysis
 """
 
-import google.generativeai as genai
 import os
-import json
-from typing import List, Dict, Optional
+import time
+from datetime import datetime
+from typing import List, Dict, Iterator, Optional, Tuple
+
+from ai_backends import AIBackend, create_backend
+from ai_cache import ResponseCache, MISS, get_response_cache
+from circuit_breaker import CircuitBreaker
+from json_extract import Schema, parse_items, parse_object
+from prompts import (NAME_TOKEN_LIMIT, estimate_tokens, truncate_text, compact_topics, student_context,
+                     QUIZ_QUESTIONS, QUESTION_BATCH, PERFORMANCE_ANALYSIS, TUTOR_SYSTEM, STUDY_PLAN, EXPLAIN_CONCEPT)
+
+# Calls slower than this (seconds) count against their circuit even when they succeed
+SLOW_CALL_SECONDS = {
+    'generate_quiz_questions': 45,
+    'analyze_student_performance': 30,
+    'chat_with_tutor': 20,
+    'generate_study_plan': 45,
+    'explain_concept': 30
+}
+
+# Estimated tokens of student context (scores, weak topics) one prompt may carry, however large the profile
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('AI_CONTEXT_TOKEN_BUDGET', 300))
+
+
+# Returned by the tutor methods when the model call fails, so callers can tell it from a real reply
+TUTOR_ERROR_REPLY = "I'm having trouble processing your request. Please try rephrasing your question or check back later."
+
+# overall_performance of the fallback analysis returned when the model call fails
+ANALYSIS_ERROR_ASSESSMENT = 'Analysis unavailable'
+
+
+def _answer_in_options(question: Dict) -> Optional[str]:
+    return None if question['correct_answer'] in question['options'] else 'correct_answer is not one of the options'
+
+
+# What the model is asked to return; anything that doesn't fit is left out and reported
+QUESTION_SCHEMA = Schema(
+    required={'question': str, 'options': list, 'correct_answer': (str, int, float)},
+    optional={'hint': str, 'explanation': str},
+    check=_answer_in_options
+)
+BATCH_QUESTION_SCHEMA = Schema(
+    required={'topic': str, 'question': str, 'options': list, 'correct_answer': (str, int, float)},
+    optional={'difficulty': str, 'hint': str, 'explanation': str},
+    check=_answer_in_options
+)
+ANALYSIS_SCHEMA = Schema(optional={'overall_performance': str, 'recommendations': list,
+                                   'focus_areas': list, 'study_strategies': list})
+STUDY_PLAN_SCHEMA = Schema(optional={'weekly_schedule': list, 'milestones': list, 'tips': list})
+
+
+def trim_history(history: List[Dict], token_budget: int) -> List[Dict]:
+    """
+    Keep the most recent chat turns that fit in a token budget
+    
+    Args:
+        history: Turns as {'role': 'user'|'model', 'parts': [{'text': ...}]}, oldest first
+        token_budget: Maximum estimated tokens across the kept turns
+        
+    Returns:
+        The newest turns within budget, starting on a user turn
+    """
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        used += sum(estimate_tokens(p.get('text', '')) for p in turn.get('parts', []))
+        if used > token_budget:
+            break
+        kept.append(turn)
+    kept.reverse()
+    # Gemini expects the history to open with a user turn
+    while kept and kept[0].get('role') != 'user':
+        kept.pop(0)
+    return kept
+
+
+def pack_question_specs(specs: List[Dict], per_prompt: int) -> List[List[Dict]]:
+    """
+    Pack (topic, difficulty, count) requests into batches of at most `per_prompt` questions
+    
+    Args:
+        specs: Dicts with 'topic', 'difficulty' and 'count'
+        per_prompt: Question budget for one prompt; larger requests are split
+        
+    Returns:
+        Batches of specs, each small enough for one generation call
+    """
+    batches = []
+    batch = []
+    room = per_prompt
+    for spec in specs:
+        remaining = spec['count']
+        while remaining:
+            if not room:
+                batches.append(batch)
+                batch, room = [], per_prompt
+            take = min(remaining, room)
+            batch.append({'topic': spec['topic'], 'difficulty': spec['difficulty'], 'count': take})
+            remaining -= take
+            room -= take
+    if batch:
+        batches.append(batch)
+    return batches
+
 
 class AIService:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the AI service with Gemini API"""
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 backend: Optional[AIBackend] = None, context_budget: Optional[int] = None):
+        """Initialize the AI service with the configured backend (Gemini unless AI_BACKEND=stub)"""
         self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
-        self.model = None
+        self.backend = backend
+        self.context_budget = context_budget or CONTEXT_TOKEN_BUDGET
+        self.cache = cache if cache is not None else get_response_cache()
         self.initialization_error = None
         self.last_error_time = None
         self.error_count = 0
-        self.max_retries = 3
-        self.retry_delay = 300  # 5 minutes
+        # One breaker per kind of call, so a failing prompt type doesn't shut off the others
+        self.breakers = {name: CircuitBreaker(name, slow_call_seconds=seconds)
+                         for name, seconds in SLOW_CALL_SECONDS.items()}
         
-        if self.api_key:
-            self._initialize_model()
-        else:
-            self.initialization_error = "GEMINI_API_KEY not set. AI features disabled."
-            print("⚠", self.initialization_error)
+        if self.backend is None:
+            self._initialize_backend()
             
-    def _initialize_model(self):
+    def _initialize_backend(self):
         try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            print("✓ AI Service initialized successfully")
+            self.backend = create_backend(self.api_key)
+            if self.backend is None:
+                self.initialization_error = "GEMINI_API_KEY not set. AI features disabled."
+                print("⚠", self.initialization_error)
+                return
+            print(f"✓ AI Service initialized successfully ({self.backend.name})")
             # Reset error tracking on successful initialization
             self.initialization_error = None
             self.error_count = 0
@@ -40,77 +145,151 @@ class AIService:
             self.initialization_error = f"AI Service initialization failed: {str(e)}"
             print("✗", self.initialization_error)
             
-    def _should_retry(self):
-        if self.error_count >= self.max_retries:
-            if self.last_error_time and (datetime.utcnow() - self.last_error_time).total_seconds() > self.retry_delay:
-                self.error_count = 0  # Reset after delay
-                return True
-            return False
-        return True
-    
     def is_available(self) -> bool:
         """Check if AI service is available"""
-        return self.model is not None
+        return self.backend is not None
+    
+    def circuit_retry_after(self, method: str) -> Optional[float]:
+        """Seconds until `method` may call the model again, or None if its circuit lets calls through"""
+        return self.breakers[method].retry_after()
     
-    def generate_quiz_questions(self, topic: str, difficulty: str = 'medium', count: int = 5) -> List[Dict]:
-        """Generate quiz questions for a specific topic using AI"""
+    def circuit_states(self) -> Dict:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+    
+    def expire_hung_calls(self, methods: List[str]) -> int:
+        """Count calls to `methods` still waiting on the model past their slow-call limit as failures"""
+        return sum(self.breakers[method].expire_hung() for method in methods)
+    
+    def _report_extraction(self, method: str, errors: List[str]):
+        """Log what was dropped from a response that was otherwise used"""
+        if errors:
+            print(f"{method}: {len(errors)} problem(s) in model output: {'; '.join(errors[:5])}")
+    
+    def _quiz_questions_prompt(self, topic: str, difficulty: str, count: int) -> Tuple[str, str]:
+        """(prompt, cache key) for a generate_quiz_questions call"""
+        prompt = QUIZ_QUESTIONS.render(count=count, topic=truncate_text(topic, NAME_TOKEN_LIMIT),
+                                       difficulty=truncate_text(difficulty, NAME_TOKEN_LIMIT))
+        return prompt, ResponseCache.make_key('generate_quiz_questions', self.backend.name, prompt)
+    
+    def cached_quiz_questions(self, topic: str, difficulty: str = 'medium', count: int = 5) -> Optional[List[Dict]]:
+        """Questions an identical earlier generate_quiz_questions call produced, or None"""
+        if not self.is_available() or not self.cache:
+            return None
+        cached = self.cache.get(self._quiz_questions_prompt(topic, difficulty, count)[1])
+        return None if cached is MISS else cached
+    
+    def generate_quiz_questions(self, topic: str, difficulty: str = 'medium', count: int = 5,
+                                use_cache: bool = True) -> List[Dict]:
+        """Generate quiz questions for a specific topic using AI; use_cache=False forces a fresh generation"""
         if not self.is_available():
             return []
         
-        prompt = f"""Generate {count} multiple choice questions about {topic} at {difficulty} difficulty level.
-
-For each question, provide:
-1. The question text
-2. Exactly 3 answer options
-3. The correct answer (must match one of the options exactly)
-4. A helpful hint
-5. A brief explanation of the correct answer
-
-Format the response as a valid JSON array with this structure:
-[
-  {{
-    "question": "Question text here?",
-    "options": ["Option A", "Option B", "Option C"],
-    "correct_answer": "Option A",
-    "hint": "Helpful hint here",
-    "explanation": "Brief explanation of why this is correct"
-  }}
-]
-
-Make questions educational, clear, and appropriate for {difficulty} level students.
-IMPORTANT: Return ONLY the JSON array, no markdown formatting."""
-
+        prompt, cache_key = self._quiz_questions_prompt(topic, difficulty, count)
+        if use_cache and self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not MISS:
+                return cached
+        
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            # Extract JSON from markdown code blocks if present
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            questions = json.loads(text)
-            
-            # Validate and format questions
-            formatted_questions = []
-            for q in questions:
-                if all(key in q for key in ['question', 'options', 'correct_answer']):
-                    formatted_questions.append({
-                        'topic': topic,
-                        'question': q['question'],
-                        'options': q['options'],
-                        'correct_answer': q['correct_answer'],
-                        'difficulty': difficulty,
-                        'hint': q.get('hint', ''),
-                        'explanation': q.get('explanation', '')
-                    })
+            text = self.breakers['generate_quiz_questions'].call(
+                self.backend.generate, prompt, 'generate_quiz_questions',
+                {'topic': topic, 'difficulty': difficulty, 'count': count}
+            )
+        except Exception as e:
+            print(f"Error generating questions: {str(e)}")
+            return []
+        
+        # Valid questions are kept even when others in the response are malformed
+        questions, errors = parse_items(text, QUESTION_SCHEMA)
+        self._report_extraction('generate_quiz_questions', errors)
+        formatted_questions = [{
+            'topic': topic,
+            'question': q['question'],
+            'options': q['options'],
+            'correct_answer': q['correct_answer'],
+            'difficulty': difficulty,
+            'hint': q.get('hint', ''),
+            'explanation': q.get('explanation', '')
+        } for q in questions[:count]]
+        
+        # A fresh result replaces any cached one, so bypassing also refreshes the cache; a salvaged
+        # or short result is returned but not cached, so the next identical call asks again
+        if not errors and len(formatted_questions) == count and self.cache:
+            self.cache.set(cache_key, formatted_questions)
+        return formatted_questions
+    
+    def generate_question_batch(self, specs: List[Dict], use_cache: bool = True) -> List[Dict]:
+        """
+        Generate questions for several topics in one model call
+        
+        Args:
+            specs: Dicts with 'topic', 'difficulty' and 'count' (see pack_question_specs)
+            use_cache: False forces a fresh generation
             
-            return formatted_questions
+        Returns:
+            Question dictionaries as from generate_quiz_questions, at most `count` per spec
+        """
+        if not self.is_available() or not specs:
+            return []
+        
+        wanted = '\n'.join(f"- {spec['count']} questions about {truncate_text(spec['topic'], NAME_TOKEN_LIMIT)} "
+                           f"at {truncate_text(spec['difficulty'], NAME_TOKEN_LIMIT)} difficulty"
+                           for spec in specs)
+        prompt = QUESTION_BATCH.render(wanted=wanted)
+
+        cache_key = ResponseCache.make_key('generate_question_batch', self.backend.name, prompt)
+        if use_cache and self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not MISS:
+                return cached
         
+        try:
+            text = self.breakers['generate_quiz_questions'].call(
+                self.backend.generate, prompt, 'generate_question_batch', {'specs': specs}
+            )
         except Exception as e:
-            print(f"Error generating questions: {str(e)}")
+            print(f"Error generating question batch: {str(e)}")
             return []
+        
+        questions, errors = parse_items(text, BATCH_QUESTION_SCHEMA)
+        self._report_extraction('generate_question_batch', errors)
+        
+        # Match each question back to its request by the topic and difficulty the prompt showed,
+        # and drop anything over the requested count
+        def prompt_name(text):
+            return truncate_text(text, NAME_TOKEN_LIMIT).strip().lower()
+        
+        requested = {}
+        for spec in specs:
+            key = (prompt_name(spec['topic']), prompt_name(spec['difficulty']))
+            requested[key] = (spec, requested.get(key, (spec, 0))[1] + spec['count'])
+        counts = {key: 0 for key in requested}
+        formatted_questions = []
+        for q in questions:
+            topic = prompt_name(q['topic'])
+            if q.get('difficulty'):
+                candidates = [(topic, prompt_name(q['difficulty']))]
+            else:
+                # No difficulty given: it fills the first request for its topic with room left
+                candidates = [key for key in requested if key[0] == topic]
+            key = next((key for key in candidates if key in requested and counts[key] < requested[key][1]), None)
+            if key is None:
+                continue
+            spec = requested[key][0]
+            counts[key] += 1
+            formatted_questions.append({
+                'topic': spec['topic'],
+                'question': q['question'],
+                'options': q['options'],
+                'correct_answer': q['correct_answer'],
+                'difficulty': spec['difficulty'],
+                'hint': q.get('hint', ''),
+                'explanation': q.get('explanation', '')
+            })
+        
+        if not errors and counts == {key: n for key, (_, n) in requested.items()} and self.cache:
+            self.cache.set(cache_key, formatted_questions)
+        return formatted_questions
     
     def analyze_student_performance(self, quiz_scores: Dict, weak_topics: List[str]) -> Dict:
         """Analyze student performance and provide personalized recommendations"""
@@ -122,457 +301,157 @@ IMPORTANT: Return ONLY the JSON array, no markdown formatting."""
                 'study_strategies': ['Regular practice', 'Seek help when needed']
             }
         
-        prompt = f"""Analyze this student's performance and provide personalized recommendations:
-
-Quiz Scores: {json.dumps(quiz_scores)}
-Weak Topics: {', '.join(weak_topics) if weak_topics else 'None identified'}
-
-Provide:
-1. Overall performance assessment (2-3 sentences)
-2. Top 3 specific recommendations for improvement
-3. Priority focus areas (ranked)
-4. Suggested study strategies
-
-Format as JSON:
-{{
-  "overall_performance": "Assessment text",
-  "recommendations": ["rec1", "rec2", "rec3"],
-  "focus_areas": ["topic1", "topic2"],
-  "study_strategies": ["strategy1", "strategy2"]
-}}
-
-IMPORTANT: Return ONLY the JSON object, no markdown formatting."""
-
+        scores, topics = student_context(quiz_scores, weak_topics, self.context_budget, empty_topics='None identified')
+        prompt = PERFORMANCE_ANALYSIS.render(scores=scores, weak_topics=topics)
+
+        fallback = {
+            'overall_performance': ANALYSIS_ERROR_ASSESSMENT,
+            'recommendations': ['Continue practicing', 'Review weak topics', 'Take regular quizzes'],
+            'focus_areas': weak_topics,
+            'study_strategies': ['Daily practice', 'Study in focused sessions']
+        }
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            analysis = json.loads(text)
-            return analysis
-        
+            text = self.breakers['analyze_student_performance'].call(
+                self.backend.generate, prompt, 'analyze_student_performance',
+                {'quiz_scores': quiz_scores, 'weak_topics': weak_topics}
+            )
         except Exception as e:
             print(f"Error analyzing performance: {str(e)}")
-            return {
-                'overall_performance': 'Analysis unavailable',
-                'recommendations': ['Continue practicing', 'Review weak topics', 'Take regular quizzes'],
-                'focus_areas': weak_topics,
-                'study_strategies': ['Daily practice', 'Study in focused sessions']
-            }
+            return fallback
+        
+        # Sections missing from a partial answer come from the fallback
+        analysis, errors = parse_object(text, ANALYSIS_SCHEMA)
+        self._report_extraction('analyze_student_performance', errors)
+        return {**fallback, **analysis} if analysis is not None else fallback
+    
+    def _tutor_history(self, context: Dict, history: List = None) -> List[Dict]:
+        """Chat history opening with the student context, sent once per call rather than
+        prefixed to every message"""
+        scores, topics = student_context(context.get('quiz_scores') or {}, context.get('weak_topics') or [],
+                                         self.context_budget)
+        system_instruction = TUTOR_SYSTEM.render(name=truncate_text(context.get('name') or 'Student', NAME_TOKEN_LIMIT),
+                                                 weak_topics=topics, scores=scores)
+
+        return [
+            {'role': 'user', 'parts': [{'text': system_instruction}]},
+            {'role': 'model', 'parts': [{'text': 'Understood. I will tutor this student following those guidelines.'}]}
+        ] + [msg for msg in (history or []) if isinstance(msg, dict)]
     
     def chat_with_tutor(self, message: str, context: Dict, history: List = None) -> str:
         """Have a conversation with the AI tutor"""
         if not self.is_available():
             return "AI tutor is currently unavailable. Please check your API configuration."
         
-        system_instruction = f"""You are LearnSphere AI, an expert and encouraging educational tutor.
-
-Student Context:
-- Name: {context.get('name', 'Student')}
-- Weak Topics: {', '.join(context.get('weak_topics', [])) or 'None'}
-- Recent Quiz Scores: {json.dumps(context.get('quiz_scores', {})) or 'No scores yet'}
-
-Guidelines:
-1. Be supportive, patient, and encouraging
-2. Explain concepts clearly with examples
-3. Use simple language appropriate for students
-4. Provide step-by-step explanations when needed
-5. Ask clarifying questions if needed
-6. Keep responses concise (2-4 paragraphs max)
-7. Use markdown formatting for better readability (bold, lists, etc.)
-8. Focus on helping the student understand, not just giving answers
-
-Current conversation context: The student has asked about their learning topics or needs help with a concept."""
-
         try:
-            # Create or continue chat
-            if history:
-                # Convert history format if needed
-                formatted_history = []
-                for msg in history:
-                    if isinstance(msg, dict):
-                        formatted_history.append(
-                            genai.types.Content(
-                                role=msg['role'],
-                                parts=[genai.types.Part.from_text(p['text']) for p in msg.get('parts', [])]
-                            )
-                        )
-                chat = self.model.start_chat(history=formatted_history)
-            else:
-                chat = self.model.start_chat()
-            
-            # Send message
-            response = chat.send_message(f"{system_instruction}\n\nStudent: {message}")
-            return response.text
+            return self.breakers['chat_with_tutor'].call(
+                self.backend.chat, self._tutor_history(context, history), message
+            )
         
         except Exception as e:
             print(f"Error in chat: {str(e)}")
-            return "I'm having trouble processing your request. Please try rephrasing your question or check back later."
+            return TUTOR_ERROR_REPLY
     
-    def generate_study_plan(self, weak_topics: List[str], available_hours: int = 10) -> Dict:
-        """Generate a personalized study plan"""
+    def stream_chat_with_tutor(self, message: str, context: Dict, history: List = None) -> Iterator[str]:
+        """Same conversation as chat_with_tutor, yielding text chunks as the model produces them"""
         if not self.is_available():
-            return {'error': 'AI service unavailable'}
+            yield "AI tutor is currently unavailable. Please check your API configuration."
+            return
         
-        prompt = f"""Create a personalized weekly study plan for a student.
-
-Weak Topics: {', '.join(weak_topics)}
-Available Study Time: {available_hours} hours per week
-
-Provide a structured plan with:
-1. Daily study schedule (which topics on which days)
-2. Time allocation per topic
-3. Specific learning activities
-4. Milestones and checkpoints
-
-Format as JSON:
-{{
-  "weekly_schedule": [
-    {{"day": "Monday", "topic": "Algebra", "duration": 2, "activities": ["Review formulas", "Practice problems"]}},
-    ...
-  ],
-  "milestones": ["Complete 10 practice problems", "Score 80% on quiz"],
-  "tips": ["Study at the same time each day", "Take breaks every 25 minutes"]
-}}
-
-IMPORTANT: Return ONLY the JSON object, no markdown formatting."""
-
+        breaker = self.breakers['chat_with_tutor']
+        sent = False
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            plan = json.loads(text)
-            return plan
-        
+            ticket = breaker.allow()
         except Exception as e:
-            print(f"Error generating study plan: {str(e)}")
-            return {
-                'error': str(e),
-                'weekly_schedule': [
-                    {
-                        'day': 'Daily',
-                        'topic': ', '.join(weak_topics),
-                        'duration': available_hours // 7,
-                        'activities': ['Review concepts', 'Practice problems']
-                    }
-                ],
-                'milestones': ['Complete daily practice'],
-                'tips': ['Stay consistent', 'Ask for help when needed']
-            }
-    
-    def explain_concept(self, topic: str, concept: str, difficulty: str = 'beginner') -> str:
-        """Get a detailed explanation of a concept"""
-        if not self.is_available():
-            return "AI explanation service is unavailable. Please check your API configuration."
+            print(f"Error in chat stream: {str(e)}")
+            yield TUTOR_ERROR_REPLY
+            return
         
-        prompt = f"""Explain the concept of "{concept}" in {topic} at {difficulty} level.
-
-Requirements:
-1. Start with a simple definition
-2. Provide a real-world analogy or example
-3. Explain the key principles
-4. Give 2-3 practice examples if applicable
-5. Use clear, simple language
-6. Use markdown formatting (bold, lists, etc.)
-
-Keep the explanation concise but comprehensive (3-5 paragraphs)."""
-
+        # Latency is time to first chunk; the outcome is recorded even if the client goes away mid-stream
+        start = time.monotonic()
+        latency = None
+        failed = True
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            for text in self.backend.stream_chat(self._tutor_history(context, history), message):
+                if latency is None:
+                    latency = time.monotonic() - start
+                sent = True
+                yield text
+            failed = False
         
+        except GeneratorExit:
+            # The client went away; that says nothing about the backend
+            failed = False
+            raise
         except Exception as e:
-            print(f"Error explaining concept: {str(e)}")
-            return f"Unable to generate explanation for {concept}. Please try again or consult your textbook."
-
-
-# Singleton instance
-_ai_service_instance = None
-
-def get_ai_service() -> AIService:
-    """Get the global AI service instance"""
-    global _ai_service_instance
-    if _ai_service_instance is None:
-        _ai_service_instance = AIService()
-    return _ai_service_instance
-    
-    def generate_quiz_questions(self, topic: str, difficulty: str = 'medium', count: int = 5) -> List[Dict]:
-        """
-        Generate quiz questions for a specific topic using AI
-        
-        Args:
-            topic: The subject topic (e.g., 'Algebra', 'Calculus')
-            difficulty: Question difficulty ('easy', 'medium', 'hard')
-            count: Number of questions to generate
-            
-        Returns:
-            List of question dictionaries
-        """
-        if not self.is_available():
-            return []
-        
-        prompt = f"""Generate {count} multiple choice questions about {topic} at {difficulty} difficulty level.
-
-For each question, provide:
-1. The question text
-2. Exactly 3 answer options
-3. The correct answer (must match one of the options exactly)
-4. A helpful hint
-5. A brief explanation of the correct answer
-
-Format the response as a valid JSON array with this structure:
-[
-  {{
-    "question": "Question text here?",
-    "options": ["Option A", "Option B", "Option C"],
-    "correct_answer": "Option A",
-    "hint": "Helpful hint here",
-    "explanation": "Brief explanation of why this is correct"
-  }}
-]
-
-Make questions educational, clear, and appropriate for {difficulty} level students."""
-
-        try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            # Extract JSON from markdown code blocks if present
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            questions = json.loads(text)
-            
-            # Validate and format questions
-            formatted_questions = []
-            for q in questions:
-                if all(key in q for key in ['question', 'options', 'correct_answer']):
-                    formatted_questions.append({
-                        'topic': topic,
-                        'question': q['question'],
-                        'options': q['options'],
-                        'correct_answer': q['correct_answer'],
-                        'difficulty': difficulty,
-                        'hint': q.get('hint', ''),
-                        'explanation': q.get('explanation', '')
-                    })
-            
-            return formatted_questions
-        
-        except Exception as e:
-            print(f"Error generating questions: {str(e)}")
-            return []
-    
-    def analyze_student_performance(self, quiz_scores: Dict, weak_topics: List[str]) -> Dict:
-        """
-        Analyze student performance and provide personalized recommendations
-        
-        Args:
-            quiz_scores: Dictionary of topic -> score (0-1)
-            weak_topics: List of topics student struggles with
-            
-        Returns:
-            Dictionary with analysis and recommendations
-        """
-        if not self.is_available():
-            return {
-                'overall_performance': 'N/A',
-                'recommendations': ['AI analysis unavailable'],
-                'focus_areas': weak_topics
-            }
-        
-        prompt = f"""Analyze this student's performance and provide personalized recommendations:
-
-Quiz Scores: {json.dumps(quiz_scores)}
-Weak Topics: {', '.join(weak_topics)}
-
-Provide:
-1. Overall performance assessment (2-3 sentences)
-2. Top 3 specific recommendations for improvement
-3. Priority focus areas (ranked)
-4. Suggested study strategies
-
-Format as JSON:
-{{
-  "overall_performance": "Assessment text",
-  "recommendations": ["rec1", "rec2", "rec3"],
-  "focus_areas": ["topic1", "topic2"],
-  "study_strategies": ["strategy1", "strategy2"]
-}}"""
-
-        try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            analysis = json.loads(text)
-            return analysis
-        
-        except Exception as e:
-            print(f"Error analyzing performance: {str(e)}")
-            return {
-                'overall_performance': 'Analysis unavailable',
-                'recommendations': ['Continue practicing weak topics'],
-                'focus_areas': weak_topics,
-                'study_strategies': ['Regular review', 'Practice problems']
-            }
-    
-    def chat_with_tutor(self, message: str, context: Dict, history: List = None) -> str:
-        """
-        Have a conversation with the AI tutor
-        
-        Args:
-            message: User's message
-            context: Student context (weak_topics, quiz_scores, etc.)
-            history: Previous conversation history
-            
-        Returns:
-            AI tutor's response
-        """
-        if not self.is_available():
-            return "AI tutor is currently unavailable. Please try again later."
-        
-        system_prompt = f"""You are LearnSphere AI, an expert and encouraging educational tutor.
-
-Student Context:
-- Name: {context.get('name', 'Student')}
-- Weak Topics: {', '.join(context.get('weak_topics', []))}
-- Quiz Scores: {json.dumps(context.get('quiz_scores', {}))}
-
-Guidelines:
-1. Be supportive, patient, and encouraging
-2. Explain concepts clearly with examples
-3. Use simple language appropriate for students
-4. Provide step-by-step explanations when needed
-5. Ask clarifying questions if needed
-6. Keep responses concise (2-4 paragraphs max)
-7. Use markdown formatting for better readability"""
-
-        try:
-            # Create or continue chat
-            if history:
-                chat = self.model.start_chat(history=history)
-            else:
-                chat = self.model.start_chat()
-            
-            # Send message with context
-            full_message = f"{system_prompt}\n\nStudent: {message}"
-            response = chat.send_message(full_message)
-            
-            return response.text
-        
-        except Exception as e:
-            print(f"Error in chat: {str(e)}")
-            return "I'm having trouble processing your request. Please try rephrasing your question."
+            print(f"Error in chat stream: {str(e)}")
+            # A reply that never started gets the usual fallback; a cut-off one is reported to the caller
+            if sent:
+                raise
+            yield TUTOR_ERROR_REPLY
+        finally:
+            breaker.record(failed, latency if latency is not None else time.monotonic() - start, ticket)
     
     def generate_study_plan(self, weak_topics: List[str], available_hours: int = 10) -> Dict:
-        """
-        Generate a personalized study plan
-        
-        Args:
-            weak_topics: Topics student needs to improve
-            available_hours: Hours available for study per week
-            
-        Returns:
-            Structured study plan
-        """
+        """Generate a personalized study plan"""
         if not self.is_available():
             return {'error': 'AI service unavailable'}
         
-        prompt = f"""Create a personalized weekly study plan for a student.
-
-Weak Topics: {', '.join(weak_topics)}
-Available Study Time: {available_hours} hours per week
-
-Provide a structured plan with:
-1. Daily study schedule (which topics on which days)
-2. Time allocation per topic
-3. Specific learning activities
-4. Milestones and checkpoints
-
-Format as JSON:
-{{
-  "weekly_schedule": [
-    {{"day": "Monday", "topic": "Algebra", "duration": 2, "activities": ["activity1", "activity2"]}},
-    ...
-  ],
-  "milestones": ["milestone1", "milestone2"],
-  "tips": ["tip1", "tip2"]
-}}"""
-
+        prompt = STUDY_PLAN.render(weak_topics=compact_topics(weak_topics, self.context_budget),
+                                   available_hours=available_hours)
+
+        fallback = {
+            'weekly_schedule': [
+                {
+                    'day': 'Daily',
+                    'topic': ', '.join(weak_topics),
+                    'duration': available_hours // 7,
+                    'activities': ['Review concepts', 'Practice problems']
+                }
+            ],
+            'milestones': ['Complete daily practice'],
+            'tips': ['Stay consistent', 'Ask for help when needed']
+        }
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0].strip()
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0].strip()
-            
-            plan = json.loads(text)
-            return plan
-        
+            text = self.breakers['generate_study_plan'].call(
+                self.backend.generate, prompt, 'generate_study_plan',
+                {'weak_topics': weak_topics, 'available_hours': available_hours}
+            )
         except Exception as e:
             print(f"Error generating study plan: {str(e)}")
-            return {'error': str(e)}
+            return {'error': str(e), **fallback}
+        
+        plan, errors = parse_object(text, STUDY_PLAN_SCHEMA)
+        self._report_extraction('generate_study_plan', errors)
+        if plan is None:
+            return {'error': errors[0], **fallback}
+        return {**fallback, **plan}
     
     def explain_concept(self, topic: str, concept: str, difficulty: str = 'beginner') -> str:
-        """
-        Get a detailed explanation of a concept
-        
-        Args:
-            topic: Subject area (e.g., 'Calculus')
-            concept: Specific concept to explain (e.g., 'derivatives')
-            difficulty: Explanation level ('beginner', 'intermediate', 'advanced')
-            
-        Returns:
-            Detailed explanation text
-        """
+        """Get a detailed explanation of a concept"""
         if not self.is_available():
-            return "AI explanation service is unavailable."
+            return "AI explanation service is unavailable. Please check your API configuration."
         
-        prompt = f"""Explain the concept of "{concept}" in {topic} at {difficulty} level.
-
-Requirements:
-1. Start with a simple definition
-2. Provide a real-world analogy or example
-3. Explain the key principles
-4. Give 2-3 practice examples if applicable
-5. Use clear, simple language
-6. Use markdown formatting
-
-Keep the explanation concise but comprehensive (3-5 paragraphs)."""
+        prompt = EXPLAIN_CONCEPT.render(concept=truncate_text(concept, NAME_TOKEN_LIMIT),
+                                        topic=truncate_text(topic, NAME_TOKEN_LIMIT),
+                                        difficulty=truncate_text(difficulty, NAME_TOKEN_LIMIT))
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.breakers['explain_concept'].call(
+                self.backend.generate, prompt, 'explain_concept',
+                {'topic': topic, 'concept': concept, 'difficulty': difficulty}
+            )
         
         except Exception as e:
             print(f"Error explaining concept: {str(e)}")
-            return f"Unable to generate explanation for {concept}. Please try again."
+            return f"Unable to generate explanation for {concept}. Please try again or consult your textbook."
 
 
 # Singleton instance
-_ai_service = None
+_ai_service_instance = None
 
 def get_ai_service() -> AIService:
     """Get the global AI service instance"""
-    global _ai_service
-    if _ai_service is None:
-        _ai_service = AIService()
-    return _ai_service
\ No newline at end of file
+    global _ai_service_instance
+    if _ai_service_instance is None:
+        _ai_service_instance = AIService()
+    return _ai_service_instance
@@ -0,0 +1,173 @@
+"""
+Circuit breaker for LearnSphere AI calls
+Fails fast while the model backend is erroring or slow, then probes for recovery
+"""
+
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while the circuit is open"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"AI backend for {name} is unavailable, retry in {int(retry_after) + 1}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Breaker for one kind of model call.
+    
+    Outcomes of the last `window` calls are kept; once at least `min_calls`
+    are in, the circuit opens when the failure rate or the rate of calls
+    slower than `slow_call_seconds` reaches its threshold. It stays open for
+    a jittered, exponentially growing cool-down, then lets `half_open_probes`
+    calls through: one failure re-opens it, all succeeding closes it.
+    
+    A call that hangs never reports back, so calls still in flight after
+    `slow_call_seconds` can be written off as failures with expire_hung().
+    """
+    
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5,
+                 failure_threshold: float = 0.5, slow_call_seconds: float = 30,
+                 slow_call_threshold: float = 0.5, base_backoff: float = 5,
+                 max_backoff: float = 300, half_open_probes: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)  # (failed, slow) per call
+        self.trips = 0
+        self.opened_until = 0.0
+        self.probe_successes = 0
+        self.last_trip_reason = None
+        self._in_flight = {}  # ticket -> start time of each call claimed with allow()
+        self._probes = set()  # tickets of the calls let through while half-open
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def allow(self) -> int:
+        """Claim permission for one call and return its ticket; raises CircuitOpenError while open"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_until - self.clock()
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self.probe_successes = 0
+            ticket = next(self._tickets)
+            if self.state == HALF_OPEN:
+                if len(self._probes) >= self.half_open_probes:
+                    raise CircuitOpenError(self.name, self.base_backoff)
+                self._probes.add(ticket)
+            self._in_flight[ticket] = self.clock()
+            return ticket
+    
+    def record(self, failed: bool, latency: float, ticket: int):
+        """Report how the call holding `ticket` from allow() went; calls already written off by expire_hung() are ignored"""
+        with self._lock:
+            if self._in_flight.pop(ticket, None) is None:
+                return
+            self._outcome(ticket, failed, latency >= self.slow_call_seconds)
+    
+    def expire_hung(self, older_than: Optional[float] = None) -> int:
+        """
+        Count calls in flight for `older_than` seconds (default slow_call_seconds) as failures
+        
+        Returns:
+            How many calls were written off; their eventual record() is ignored
+        """
+        cutoff = self.clock() - (self.slow_call_seconds if older_than is None else older_than)
+        with self._lock:
+            hung = [ticket for ticket, start in self._in_flight.items() if start <= cutoff]
+            for ticket in hung:
+                del self._in_flight[ticket]
+                self._outcome(ticket, True, True)
+            return len(hung)
+    
+    def _outcome(self, ticket: int, failed: bool, slow: bool):
+        probe = ticket in self._probes
+        self._probes.discard(ticket)
+        if self.state != CLOSED and not probe:
+            # Let through before the circuit opened; only the probes decide whether it closes
+            return
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._open('probe failed' if failed else 'probe slow')
+            else:
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self.state = CLOSED
+                    self.trips = 0
+                    self.outcomes.clear()
+            return
+        
+        self.outcomes.append((failed, slow))
+        if len(self.outcomes) < self.min_calls:
+            return
+        failure_rate = sum(f for f, _ in self.outcomes) / len(self.outcomes)
+        slow_rate = sum(s for _, s in self.outcomes) / len(self.outcomes)
+        if failure_rate >= self.failure_threshold:
+            self._open(f'failure rate {failure_rate:.0%}')
+        elif slow_rate >= self.slow_call_threshold:
+            self._open(f'slow call rate {slow_rate:.0%}')
+    
+    def _open(self, reason: str):
+        # Full jitter keeps workers from probing a recovering backend in lockstep
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** self.trips)
+        self.opened_until = self.clock() + random.uniform(ceiling / 2, ceiling)
+        self.trips += 1
+        self.state = OPEN
+        self.outcomes.clear()
+        self._probes.clear()
+        self.last_trip_reason = reason
+    
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn through the breaker; exceptions count as failures and propagate"""
+        ticket = self.allow()
+        start = self.clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(True, self.clock() - start, ticket)
+            raise
+        self.record(False, self.clock() - start, ticket)
+        return result
+    
+    def retry_after(self) -> Optional[float]:
+        """Seconds until the next probe is allowed, or None if calls may go through"""
+        with self._lock:
+            if self.state == OPEN and self.opened_until > self.clock():
+                return self.opened_until - self.clock()
+            if self.state == HALF_OPEN and len(self._probes) >= self.half_open_probes:
+                return self.base_backoff
+            return None
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'recent_calls': len(self.outcomes),
+                'recent_failures': sum(f for f, _ in self.outcomes),
+                'recent_slow_calls': sum(s for _, s in self.outcomes),
+                'trips': self.trips,
+                'retry_after': round(max(self.opened_until - self.clock(), 0), 1) if self.state == OPEN else None,
+                'last_trip_reason': self.last_trip_reason
+            }
@@ -0,0 +1,39 @@
+"""
+Question bank deduplication utility for LearnSphere
+Merges duplicate and near-duplicate questions into their oldest copy
+"""
+
+import sys
+
+from app import app, QuizQuestion, backfill_question_hashes, create_missing_indexes, merge_duplicate_questions
+
+def dedupe_questions(dry_run=False):
+    """Merge exact and near-duplicate questions (report only with --dry-run)"""
+    
+    print("\n" + "="*60)
+    print("🧹 LearnSphere Question Deduplication" + (" (dry run)" if dry_run else ""))
+    print("="*60)
+    
+    with app.app_context():
+        print("\n🔑 Hashing questions...")
+        hashed = backfill_question_hashes()
+        print(f"✓ {hashed} questions hashed")
+        
+        print("\n🔍 Looking for duplicates...")
+        merges = merge_duplicate_questions(include_near=True, dry_run=dry_run)
+        for kept_id, removed_id, similarity in merges:
+            label = 'exact' if similarity == 1.0 else f'{similarity:.0%} similar'
+            print(f"   #{removed_id} -> #{kept_id} ({label})")
+        print(f"✓ {len(merges)} duplicates {'found' if dry_run else 'merged'}")
+        print(f"✓ {QuizQuestion.query.count()} questions in the bank")
+        
+        if not dry_run:
+            # Boot skips the unique (topic, content_hash) index while exact duplicates remain
+            create_missing_indexes()
+            print("✓ Unique question index in place")
+        
+        print("\n✅ Deduplication complete!")
+
+
+if __name__ == '__main__':
+    dedupe_questions(dry_run='--dry-run' in sys.argv)
@@ -0,0 +1,180 @@
+"""
+Event broker for LearnSphere
+Pub/sub feeding the Server-Sent Events stream, relayed between workers through the database
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One open event stream; events wait in a bounded queue until the stream sends them"""
+    
+    def __init__(self, user_id: int, role: str, max_queue: int):
+        self.user_id = user_id
+        self.role = role
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+    
+    def push(self, event_type: str, data: Dict):
+        try:
+            self.queue.put_nowait((event_type, data))
+        except queue.Full:
+            # A client this far behind resyncs over REST when it reconnects
+            self.closed = True
+    
+    def get(self, timeout: float) -> Optional[tuple]:
+        """Next (event_type, data) pair, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """
+    Fans events out to the subscriptions held by this process.
+    
+    Each worker process has its own broker and only knows its own streams, so
+    publishers don't call it directly: they write the event to the shared
+    table and every worker's EventRelay hands it to deliver().
+    """
+    
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+    
+    def subscribe(self, user_id: int, role: str) -> Subscription:
+        subscription = Subscription(user_id, role, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+    
+    def publish(self, user_id: int, event_type: str, data: Dict):
+        """Send an event to every open stream of one user"""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event_type, data)
+    
+    def broadcast(self, event_type: str, data: Dict, role: Optional[str] = None):
+        """Send an event to every open stream, optionally only those of one role"""
+        with self._lock:
+            subscriptions = [s for subs in self._subscribers.values() for s in subs]
+        for subscription in subscriptions:
+            if role is None or subscription.role == role:
+                subscription.push(event_type, data)
+    
+    def deliver(self, user_id: Optional[int], role: Optional[str], event_type: str, data: Dict):
+        """Send a relayed event to one user's streams, or to every stream (of `role`) when user_id is None"""
+        if user_id is None:
+            self.broadcast(event_type, data, role=role)
+        else:
+            self.publish(user_id, event_type, data)
+    
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+
+# (id, user_id, role, event_type, data) of one stored event
+StoredEvent = Tuple[int, Optional[int], Optional[str], str, Dict]
+
+
+class EventRelay:
+    """
+    Background thread passing events stored by any worker to this worker's broker.
+    
+    Every `interval` seconds it asks `fetch` for the events after the newest
+    one it has seen. Ids are handed out on insert but only show up once their
+    transaction commits, so a slow transaction can commit an id below that
+    one; ids skipped over are asked for again for `settle_seconds`.
+    """
+    
+    def __init__(self, fetch: Callable[[int, List[int]], List[StoredEvent]],
+                 deliver: Callable[[Optional[int], Optional[str], str, Dict], None],
+                 latest: Callable[[], int], prune: Optional[Callable[[], None]] = None,
+                 interval: float = 1.0, settle_seconds: float = 30, prune_every: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.fetch = fetch
+        self.deliver = deliver
+        self.latest = latest
+        self.prune = prune
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.prune_every = prune_every
+        self.clock = clock
+        self.last_id = None
+        self._gaps: Dict[int, float] = {}  # id skipped over -> when it was first missed
+        self._next_prune = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start relaying events stored from now on"""
+        if self._thread is not None:
+            return
+        self.last_id = self.latest()
+        self._thread = threading.Thread(target=self._run, name='event-relay', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def poll(self) -> int:
+        """Deliver the events stored since the last poll; returns how many there were"""
+        if self.last_id is None:
+            self.last_id = self.latest()
+            return 0
+        events = self.fetch(self.last_id, list(self._gaps))
+        now = self.clock()
+        for event_id, user_id, role, event_type, data in events:
+            self._gaps.pop(event_id, None)
+            if event_id > self.last_id:
+                self._gaps.update((missing, now) for missing in range(self.last_id + 1, event_id))
+                self.last_id = event_id
+            self.deliver(user_id, role, event_type, data)
+        self._gaps = {event_id: missed for event_id, missed in self._gaps.items()
+                      if now - missed < self.settle_seconds}
+        return len(events)
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+                if self.prune and self.clock() >= self._next_prune:
+                    self._next_prune = self.clock() + self.prune_every
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Event relay poll failed: {str(e)}")
+
+
+def format_sse(event_type: str, data: Dict) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+# Singleton instance
+_event_broker = None
+
+def get_event_broker() -> EventBroker:
+    """Get the process-wide event broker"""
+    global _event_broker
+    if _event_broker is None:
+        _event_broker = EventBroker()
+    return _event_broker
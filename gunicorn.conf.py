@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for LearnSphere
+The master loads the app and prepares the database once, before forking; workers
+start serving straight away. Picked up automatically by `gunicorn app:app`.
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+preload_app = True
+
+# Requires gevent workers (or gthread with many threads). Event streams stay open and AI
+# calls wait on the model for seconds at a time; a gevent worker serves each request on
+# a greenlet, so neither pins an OS thread. With GUNICORN_WORKER_CLASS=gthread every open
+# stream and AI wait holds one of `threads`.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+
+# The app sizes its AI lanes from the requests one worker can hold
+os.environ.setdefault('REQUEST_CONCURRENCY', str(worker_connections if worker_class == 'gevent' else threads))
+
+if worker_class == 'gevent':
+    # preload_app imports the app in the master, so patch before it creates any lock, thread or socket
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    """Runs once in the master: logging, schema, migrations and seed data"""
+    from app import prepare_app
+    prepare_app()
+
+
+def post_fork(server, worker):
+    """Runs in each worker: threads such as the reminder scheduler don't survive fork"""
+    from app import start_worker
+    start_worker()
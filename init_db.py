@@ -87,16 +87,16 @@ def init_database():
             profile = StudentProfile(
                 user_id=student.id,
                 weak_topics=json.dumps(student_data['weak_topics']),
-                quiz_scores=json.dumps(student_data['quiz_scores']),
-                completed_modules=json.dumps(student_data['completed_modules']),
                 final_test_score=None,
                 streak=student_data['streak'],
-                achievements=json.dumps(student_data['achievements']),
                 study_time=student_data['study_time'],
                 notes=json.dumps({}),
                 bookmarks=json.dumps([]),
                 last_login_date=(datetime.utcnow() - timedelta(days=1)).date()
             )
+            profile.set_quiz_scores(student_data['quiz_scores'])
+            profile.set_completed_modules(student_data['completed_modules'])
+            profile.set_achievements(student_data['achievements'])
             db.session.add(profile)
             
             # Add welcome notification
@@ -395,16 +395,16 @@ def init_database():
             profile = StudentProfile(
                 user_id=student.id,
                 weak_topics=json.dumps(student_data['weak_topics']),
-                quiz_scores=json.dumps({'Algebra': 0.85, 'Geometry': 0.75}),
-                completed_modules=json.dumps(['Algebra']),
                 final_test_score=None,
                 streak=3,
-                achievements=json.dumps(['first_step']),
                 study_time=7200,
                 notes=json.dumps({}),
                 bookmarks=json.dumps([]),
                 last_login_date=(datetime.utcnow() - timedelta(days=1)).date()
             )
+            profile.set_quiz_scores({'Algebra': 0.85, 'Geometry': 0.75})
+            profile.set_completed_modules(['Algebra'])
+            profile.set_achievements(['first_step'])
             db.session.add(profile)
         
         db.session.commit()
@@ -0,0 +1,238 @@
+"""
+JSON extraction for LearnSphere's model responses
+Salvages what it can from fenced, chatty, malformed or cut-off output instead of failing the whole call
+"""
+
+import json
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+_CLOSERS = {'{': '}', '[': ']'}
+
+# Attempts at closing a cut-off object before giving up on it
+MAX_REPAIR_ATTEMPTS = 50
+
+
+class Extraction(NamedTuple):
+    value: Any
+    errors: List[str]
+
+
+class Schema:
+    """
+    Expected fields of a JSON object, each with a type or tuple of types.
+    
+    Fields of the wrong type are dropped; fields not listed are kept as they are.
+    `check` sees the cleaned object and returns a problem, or None if it is fine.
+    """
+    
+    def __init__(self, required: Dict[str, Any] = None, optional: Dict[str, Any] = None,
+                 check: Optional[Callable[[Dict], Optional[str]]] = None):
+        self.required = required or {}
+        self.optional = optional or {}
+        self.check = check
+    
+    def clean(self, value: Any) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Validate one object
+        
+        Args:
+            value: Decoded JSON value
+        
+        Returns:
+            (the object without its invalid fields, or None if a required field is missing
+            or invalid or the check fails; the problems found)
+        """
+        if not isinstance(value, dict):
+            return None, [f'expected an object, got {type(value).__name__}']
+        fields = {**self.optional, **self.required}
+        kept = {name: field for name, field in value.items() if name not in fields}
+        problems = []
+        for name, expected in fields.items():
+            if name not in value:
+                if name in self.required:
+                    problems.append(f'missing {name}')
+            elif isinstance(value[name], expected):
+                kept[name] = value[name]
+            else:
+                problems.append(f'{name} has the wrong type ({type(value[name]).__name__})')
+        if any(name not in kept for name in self.required):
+            return None, problems
+        problem = self.check(kept) if self.check else None
+        if problem:
+            return None, problems + [problem]
+        return kept, problems
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _skip_value(text: str, pos: int) -> Optional[int]:
+    """End of the (possibly malformed) array element starting at `pos`, or None if the text runs out first"""
+    stack = []
+    in_string = escaped = False
+    for index in range(pos, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            stack.append(char)
+        elif char in ']}':
+            if not stack:
+                if char == ']':
+                    return index
+                # A stray } outside any element is skipped like any other damaged character
+                continue
+            # A stray closer of the wrong kind is part of the damage, not the end of the element
+            if _CLOSERS[stack[-1]] == char:
+                stack.pop()
+                if not stack:
+                    return index + 1
+        elif char == ',' and not stack:
+            return index
+    return None
+
+
+def _repair_truncated(text: str, start: int) -> Any:
+    """Decode a cut-off value by dropping the incomplete tail and closing what is still open"""
+    stack = []
+    cuts = []
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                cuts.append((index + 1, ''.join(stack)))
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            stack.append(char)
+        elif char in ']}':
+            if not stack:
+                break
+            stack.pop()
+            if stack:
+                cuts.append((index + 1, ''.join(stack)))
+        elif char == ',':
+            cuts.append((index, ''.join(stack)))
+    for end, still_open in reversed(cuts[-MAX_REPAIR_ATTEMPTS:]):
+        candidate = text[start:end] + ''.join(_CLOSERS[opener] for opener in reversed(still_open))
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_items(text: str, schema: Optional[Schema] = None) -> Extraction:
+    """
+    Pull every usable element out of a JSON array in a model response
+    
+    Surrounding prose and markdown fences are ignored, as is an object wrapping
+    the array. Elements are decoded one at a time, so a malformed or invalid
+    element only costs itself, and a cut-off response keeps its complete elements.
+    
+    Args:
+        text: Raw model output
+        schema: Validates each element; invalid ones are left out
+    
+    Returns:
+        Extraction of (valid elements, one message per element that was left out or trimmed)
+    """
+    text = text or ''
+    start = text.find('[')
+    brace = text.find('{')
+    if brace != -1 and (start == -1 or brace < start):
+        # An object first: either a wrapper such as {"questions": [...]} or a lone element
+        try:
+            value, _ = _decoder.raw_decode(text, brace)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, dict):
+            wrapped = [field for field in value.values() if isinstance(field, list)]
+            return _validate_items(list(enumerate(wrapped[0] if len(wrapped) == 1 else [value])), schema, [])
+    if start == -1:
+        return Extraction([], ['no JSON array found in response'])
+    
+    items = []
+    errors = []
+    pos = _skip_whitespace(text, start + 1)
+    index = 0
+    while pos < len(text) and text[pos] != ']':
+        if text[pos] == ',':
+            pos = _skip_whitespace(text, pos + 1)
+            continue
+        try:
+            value, end = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError as e:
+            end = _skip_value(text, pos)
+            if end is None:
+                errors.append((index, f'cut off ({e.msg})'))
+                break
+            errors.append((index, f'invalid JSON ({e.msg})'))
+        else:
+            items.append((index, value))
+        index += 1
+        # Always move forward, whatever the damage, so no reply can stall the loop
+        pos = _skip_whitespace(text, max(end, pos + 1))
+    return _validate_items(items, schema, errors)
+
+
+def _validate_items(items: List[Tuple[int, Any]], schema: Optional[Schema],
+                    errors: List[Tuple[int, str]]) -> Extraction:
+    valid = []
+    for index, item in items:
+        cleaned, problems = schema.clean(item) if schema else (item, [])
+        if cleaned is not None:
+            valid.append(cleaned)
+        if problems:
+            errors.append((index, '; '.join(problems) + ('' if cleaned is None else ' (kept the rest)')))
+    return Extraction(valid, [f'item {index}: {problem}' for index, problem in sorted(errors)])
+
+
+def parse_object(text: str, schema: Optional[Schema] = None) -> Extraction:
+    """
+    Pull a JSON object out of a model response
+    
+    Surrounding prose and markdown fences are ignored. A cut-off object keeps its
+    complete fields.
+    
+    Args:
+        text: Raw model output
+        schema: Fields of the wrong type are dropped and reported
+    
+    Returns:
+        Extraction of (the object, or None if there is none; problems found)
+    """
+    text = text or ''
+    start = text.find('{')
+    if start == -1:
+        return Extraction(None, ['no JSON object found in response'])
+    errors = []
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+    except json.JSONDecodeError as e:
+        value = _repair_truncated(text, start)
+        if value is None:
+            return Extraction(None, [f'invalid JSON ({e.msg})'])
+        errors.append(f'response was cut off ({e.msg}); kept the complete fields')
+    if schema is None:
+        return Extraction(value, errors)
+    cleaned, problems = schema.clean(value)
+    return Extraction(cleaned, errors + problems)
@@ -0,0 +1,33 @@
+"""
+Database migration utility for LearnSphere
+Converts legacy JSON profile columns into the relational score tables
+"""
+
+from app import app, db, add_missing_columns, migrate_profile_json_columns, rebuild_leaderboard
+
+def migrate_database():
+    """Create new tables and move legacy profile data into them"""
+    
+    print("\n" + "="*60)
+    print("🔧 LearnSphere Database Migration")
+    print("="*60)
+    
+    with app.app_context():
+        print("\n📋 Creating missing tables...")
+        db.create_all()
+        add_missing_columns()
+        print("✓ Tables up to date")
+        
+        print("\n🔄 Converting student profiles...")
+        migrated = migrate_profile_json_columns()
+        print(f"✓ {migrated} profiles converted")
+        
+        print("\n🏆 Rebuilding leaderboard...")
+        rebuild_leaderboard()
+        print("✓ Leaderboard rebuilt")
+        
+        print("\n✅ Migration complete!")
+
+
+if __name__ == '__main__':
+    migrate_database()
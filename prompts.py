@@ -0,0 +1,232 @@
+"""
+Prompt templates for LearnSphere's AI calls
+Templates are parsed once at import; student context is compacted to fit a token budget
+"""
+
+import string
+from typing import Dict, List, Tuple
+
+# Longest topic or concept name passed through to a prompt, in estimated tokens
+NAME_TOKEN_LIMIT = 50
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini models (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def truncate_text(text: str, token_budget: int) -> str:
+    """Cut free text to roughly `token_budget` tokens"""
+    text = str(text)
+    limit = token_budget * 4
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+
+def compact_scores(quiz_scores: Dict[str, float], token_budget: int) -> str:
+    """
+    Encode quiz scores as "Topic 45%", weakest first, within a token budget
+
+    Args:
+        quiz_scores: Topic -> score (0-1)
+        token_budget: Estimated tokens the encoding may use
+
+    Returns:
+        The weakest topics that fit, then a one-line summary of the rest
+    """
+    if not quiz_scores:
+        return 'No scores yet'
+    ordered = sorted(quiz_scores.items(), key=lambda item: (item[1], item[0]))
+    parts = []
+    used = 0
+    for topic, score in ordered:
+        part = f'{truncate_text(topic, NAME_TOKEN_LIMIT)} {round(score * 100)}%'
+        used += estimate_tokens(part) + 1
+        if used > token_budget and parts:
+            break
+        parts.append(part)
+    rest = ordered[len(parts):]
+    if rest:
+        average = sum(score for _, score in rest) / len(rest)
+        parts.append(f'+{len(rest)} more topics averaging {round(average * 100)}%')
+    return ', '.join(parts)
+
+
+def compact_topics(topics: List[str], token_budget: int, empty: str = 'None') -> str:
+    """Comma-separated topics in the given order, with a count of any that don't fit the budget"""
+    if not topics:
+        return empty
+    parts = []
+    used = 0
+    for topic in topics:
+        part = truncate_text(topic, NAME_TOKEN_LIMIT)
+        used += estimate_tokens(part) + 1
+        if used > token_budget and parts:
+            break
+        parts.append(part)
+    if len(parts) < len(topics):
+        parts.append(f'+{len(topics) - len(parts)} more')
+    return ', '.join(parts)
+
+
+def student_context(quiz_scores: Dict[str, float], weak_topics: List[str], token_budget: int,
+                    empty_topics: str = 'None') -> Tuple[str, str]:
+    """
+    Compact text for a student's scores and weak topics, sharing one token budget
+
+    Args:
+        quiz_scores: Topic -> score (0-1)
+        weak_topics: Topics the student struggles with; the lowest-scoring are kept first
+        token_budget: Estimated tokens for both; two thirds go to the scores
+        empty_topics: Text used when there are no weak topics
+
+    Returns:
+        (scores text, weak topics text)
+    """
+    topics_budget = token_budget // 3
+    ranked = sorted(weak_topics, key=lambda topic: quiz_scores.get(topic, 0))
+    return (compact_scores(quiz_scores, token_budget - topics_budget),
+            compact_topics(ranked, topics_budget, empty=empty_topics))
+
+
+class PromptTemplate:
+    """A str.format-style template, split into literal text and fields once up front"""
+    
+    def __init__(self, text: str):
+        self.segments = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f'Unsupported field format in prompt template: {field}')
+            self.segments.append((literal, field))
+        self.fields = {field for _, field in self.segments if field is not None}
+    
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt template needs {', '.join(sorted(missing))}")
+        return ''.join(literal if field is None else literal + str(values[field])
+                       for literal, field in self.segments)
+
+
+QUIZ_QUESTIONS = PromptTemplate("""Generate {count} multiple choice questions about {topic} at {difficulty} difficulty level.
+
+For each question, provide:
+1. The question text
+2. Exactly 3 answer options
+3. The correct answer (must match one of the options exactly)
+4. A helpful hint
+5. A brief explanation of the correct answer
+
+Format the response as a valid JSON array with this structure:
+[
+  {{
+    "question": "Question text here?",
+    "options": ["Option A", "Option B", "Option C"],
+    "correct_answer": "Option A",
+    "hint": "Helpful hint here",
+    "explanation": "Brief explanation of why this is correct"
+  }}
+]
+
+Make questions educational, clear, and appropriate for {difficulty} level students.
+IMPORTANT: Return ONLY the JSON array, no markdown formatting.""")
+
+QUESTION_BATCH = PromptTemplate("""Generate multiple choice questions for each of these requests:
+{wanted}
+
+For each question, provide:
+1. The topic and difficulty exactly as written in its request
+2. The question text
+3. Exactly 3 answer options
+4. The correct answer (must match one of the options exactly)
+5. A helpful hint
+6. A brief explanation of the correct answer
+
+Format the response as a single valid JSON array with this structure:
+[
+  {{
+    "topic": "Topic from the request",
+    "difficulty": "Difficulty from the request",
+    "question": "Question text here?",
+    "options": ["Option A", "Option B", "Option C"],
+    "correct_answer": "Option A",
+    "hint": "Helpful hint here",
+    "explanation": "Brief explanation of why this is correct"
+  }}
+]
+
+IMPORTANT: Return ONLY the JSON array, no markdown formatting.""")
+
+PERFORMANCE_ANALYSIS = PromptTemplate("""Analyze this student's performance and provide personalized recommendations:
+
+Quiz Scores: {scores}
+Weak Topics: {weak_topics}
+
+Provide:
+1. Overall performance assessment (2-3 sentences)
+2. Top 3 specific recommendations for improvement
+3. Priority focus areas (ranked)
+4. Suggested study strategies
+
+Format as JSON:
+{{
+  "overall_performance": "Assessment text",
+  "recommendations": ["rec1", "rec2", "rec3"],
+  "focus_areas": ["topic1", "topic2"],
+  "study_strategies": ["strategy1", "strategy2"]
+}}
+
+IMPORTANT: Return ONLY the JSON object, no markdown formatting.""")
+
+TUTOR_SYSTEM = PromptTemplate("""You are LearnSphere AI, an expert and encouraging educational tutor.
+
+Student Context:
+- Name: {name}
+- Weak Topics: {weak_topics}
+- Recent Quiz Scores: {scores}
+
+Guidelines:
+1. Be supportive, patient, and encouraging
+2. Explain concepts clearly with examples
+3. Use simple language appropriate for students
+4. Provide step-by-step explanations when needed
+5. Ask clarifying questions if needed
+6. Keep responses concise (2-4 paragraphs max)
+7. Use markdown formatting for better readability (bold, lists, etc.)
+8. Focus on helping the student understand, not just giving answers
+
+Current conversation context: The student has asked about their learning topics or needs help with a concept.""")
+
+STUDY_PLAN = PromptTemplate("""Create a personalized weekly study plan for a student.
+
+Weak Topics: {weak_topics}
+Available Study Time: {available_hours} hours per week
+
+Provide a structured plan with:
+1. Daily study schedule (which topics on which days)
+2. Time allocation per topic
+3. Specific learning activities
+4. Milestones and checkpoints
+
+Format as JSON:
+{{
+  "weekly_schedule": [
+    {{"day": "Monday", "topic": "Algebra", "duration": 2, "activities": ["Review formulas", "Practice problems"]}},
+    ...
+  ],
+  "milestones": ["Complete 10 practice problems", "Score 80% on quiz"],
+  "tips": ["Study at the same time each day", "Take breaks every 25 minutes"]
+}}
+
+IMPORTANT: Return ONLY the JSON object, no markdown formatting.""")
+
+EXPLAIN_CONCEPT = PromptTemplate("""Explain the concept of "{concept}" in {topic} at {difficulty} level.
+
+Requirements:
+1. Start with a simple definition
+2. Provide a real-world analogy or example
+3. Explain the key principles
+4. Give 2-3 practice examples if applicable
+5. Use clear, simple language
+6. Use markdown formatting (bold, lists, etc.)
+
+Keep the explanation concise but comprehensive (3-5 paragraphs).""")
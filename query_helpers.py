@@ -0,0 +1,141 @@
+"""
+Query helpers for LearnSphere
+Eager-loading strategies and a per-request query budget that catches N+1 loads
+"""
+
+from functools import wraps
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+DEFAULT_QUERY_BUDGET = 25
+
+
+def eager(query, *paths):
+    """
+    Eager-load relationship paths on a query
+    
+    Args:
+        query: The query to add loader options to
+        paths: Tuples of relationship attributes, e.g. (User.student_profile, StudentProfile.topic_scores)
+        
+    Returns:
+        The query with loader options applied. Scalar relationships are joined
+        into the parent SELECT; collections are fetched with one SELECT ... IN
+        per path, however many parent rows there are.
+    """
+    options = []
+    for path in paths:
+        loader = None
+        for attr in path:
+            strategy = 'selectinload' if attr.property.uselist else 'joinedload'
+            if loader is None:
+                loader = selectinload(attr) if strategy == 'selectinload' else joinedload(attr)
+            else:
+                loader = getattr(loader, strategy)(attr)
+        options.append(loader)
+    return query.options(*options)
+
+
+def query_budget(limit):
+    """Override the per-request query budget for a single endpoint"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return f(*args, **kwargs)
+        decorated_function.query_budget = limit
+        return decorated_function
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _note_commit(session):
+    if has_request_context():
+        g.query_budget_committed = True
+
+
+def init_query_budget(app):
+    """
+    Report requests that run more SQL statements than their budget
+    
+    Active in debug and testing mode, or whenever QUERY_BUDGET is configured;
+    each response then carries an X-Query-Count header. Overruns are logged,
+    and fail the request with a 500 only under testing or an explicit
+    QUERY_BUDGET, and only if the view has not committed anything (the client
+    must never be told a write that happened has failed).
+    """
+    @app.after_request
+    def enforce_query_budget(response):
+        configured = app.config.get('QUERY_BUDGET')
+        if not (configured or app.debug or app.testing):
+            return response
+        
+        count = g.get('query_count', 0)
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None) or configured or DEFAULT_QUERY_BUDGET
+        response.headers['X-Query-Count'] = str(count)
+        
+        if count > budget:
+            message = f'{request.method} {request.path} ran {count} queries (budget {budget})'
+            if not (configured or app.testing) or g.get('query_budget_committed'):
+                app.logger.warning(f'Query budget exceeded: {message}')
+                return response
+            app.logger.error(f'Query budget exceeded: {message}')
+            failed = jsonify({'error': 'Query budget exceeded', 'message': message})
+            failed.status_code = 500
+            failed.headers['X-Query-Count'] = str(count)
+            return failed
+        return response
+
+
+def page_args(default_limit, max_limit):
+    """Read the `after` cursor and `limit` keyset-pagination arguments from the request"""
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+    return after, limit
+
+
+def keyset_page(query, key_column, after, limit):
+    """
+    Fetch one page ordered by a unique, indexed key
+    
+    Args:
+        query: Base query (filters already applied)
+        key_column: Column to page on, e.g. QuizQuestion.id
+        after: Key of the last row of the previous page, or None for the first page
+        limit: Page size
+        
+    Returns:
+        (rows, next_cursor) where next_cursor is None on the last page
+    """
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], key_column.key)
+    return rows, None
+
+
+def requested_fields(allowed):
+    """
+    Parse the comma-separated `fields` projection argument
+    
+    Returns:
+        (fields, error) - fields is the full allowed list when the argument is absent
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return list(allowed), None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+    return fields, None
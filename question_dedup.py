@@ -0,0 +1,142 @@
+"""
+Question deduplication for LearnSphere
+Normalized-text hashes catch exact repeats; MinHash signatures catch near-duplicates
+"""
+
+import hashlib
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+# Sentence punctuation is dropped; operators such as + - = stay, since they change the question
+_TOKEN = re.compile(r"\w+|[^\w\s?.,!;:'\"`]")
+_PRIME = (1 << 61) - 1
+
+
+def normalize_question(text: str) -> str:
+    """Case-, width- and punctuation-insensitive form of a question ("x²" and "X2" agree)"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(_TOKEN.findall(text))
+
+
+def question_hash(text: str) -> str:
+    """Hex digest of the normalized text; equal hashes within a topic are duplicates"""
+    return hashlib.sha256(normalize_question(text).encode('utf-8')).hexdigest()
+
+
+def shingles(normalized: str, size: int = 3) -> Set[str]:
+    tokens = normalized.split(' ')
+    if len(tokens) <= size:
+        return {normalized}
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """Fixed family of hash functions turning a shingle set into a short signature"""
+    
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+    
+    def signature(self, items: Set[str]) -> Tuple[int, ...]:
+        hashed = [int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for item in items]
+        return tuple(min((a * h + b) % _PRIME for h in hashed) for a, b in self.params)
+
+
+_default_hasher = MinHasher()
+
+
+class QuestionIndex:
+    """
+    Duplicate lookup over a question bank, scoped per topic.
+    
+    Exact matches come from the normalized-text hash. Near-duplicates use
+    LSH banding over MinHash signatures: questions sharing any band become
+    candidates, and a candidate matches when the share of agreeing signature
+    slots (an estimate of shingle Jaccard similarity) reaches `threshold`.
+    
+    Questions can be added, replaced and removed one at a time, so a long-lived
+    index follows edits without being rebuilt. Lookups only read, and tolerate
+    an edit made from another thread while they run.
+    """
+    
+    def __init__(self, threshold: float = 0.8, bands: int = 16, hasher: MinHasher = _default_hasher):
+        self.threshold = threshold
+        self.hasher = hasher
+        self.bands = bands
+        self.rows = len(hasher.params) // bands
+        self.entries: Dict[Hashable, Tuple[str, str]] = {}  # key -> (topic, question_hash)
+        self.hashes: Dict[Tuple[str, str], List[Hashable]] = defaultdict(list)
+        self.signatures: Dict[Hashable, Tuple[int, ...]] = {}
+        self.buckets: Dict[tuple, List[Hashable]] = defaultdict(list)
+    
+    def __len__(self) -> int:
+        return len(self.signatures)
+    
+    def _bands(self, topic: str, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield (topic, band, signature[band * self.rows:(band + 1) * self.rows])
+    
+    def add(self, key: Hashable, topic: str, text: str, digest: Optional[str] = None):
+        """Index a question under `key`, replacing what the key held before; `digest` is its question_hash if known"""
+        if key in self.entries:
+            self.remove(key)
+        digest = digest or question_hash(text)
+        signature = self.hasher.signature(shingles(normalize_question(text)))
+        self.signatures[key] = signature
+        for bucket in self._bands(topic, signature):
+            self.buckets[bucket].append(key)
+        self.hashes[(topic, digest)].append(key)
+        self.entries[key] = (topic, digest)
+    
+    def remove(self, key: Hashable):
+        """Drop a question from the index; unknown keys are ignored"""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self._discard(self.hashes, entry, key)
+        signature = self.signatures.pop(key)
+        for bucket in self._bands(entry[0], signature):
+            self._discard(self.buckets, bucket, key)
+    
+    @staticmethod
+    def _discard(lists: Dict, slot, key: Hashable):
+        keys = lists[slot]
+        keys.remove(key)
+        if not keys:
+            del lists[slot]
+    
+    def find(self, topic: str, text: str, exclude: Optional[Hashable] = None) -> Optional[Tuple[Hashable, float]]:
+        """
+        Find the closest existing question
+        
+        Args:
+            topic: Only questions in this topic are compared
+            text: Question text to look up
+            exclude: Key to ignore, e.g. the question being edited
+            
+        Returns:
+            (key, similarity) with similarity 1.0 for an exact match, or None
+        """
+        for exact in tuple(self.hashes.get((topic, question_hash(text)), ())):
+            if exact != exclude:
+                return exact, 1.0
+        
+        signature = self.hasher.signature(shingles(normalize_question(text)))
+        best = None
+        seen = set()
+        for bucket in self._bands(topic, signature):
+            for key in tuple(self.buckets.get(bucket, ())):
+                if key == exclude or key in seen:
+                    continue
+                seen.add(key)
+                other = self.signatures.get(key)
+                if other is None:
+                    continue
+                similarity = sum(a == b for a, b in zip(signature, other)) / len(signature)
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (key, similarity)
+        return best
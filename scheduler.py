@@ -0,0 +1,105 @@
+"""
+Reminder scheduler for LearnSphere
+Fires study-plan reminders from a min-heap keyed on each plan's due time
+"""
+
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """
+    Single background thread that sleeps until the earliest pending reminder.
+    
+    The heap only decides *when* to look at a plan; `fire` receives the due
+    plan ids in batches and must re-check them against the database, which
+    is what makes cancelled plans, several workers and restarts safe.
+    """
+    
+    def __init__(self, fire: Callable[[List[int]], None], batch_size: int = 200,
+                 retry_delay: int = 60, clock: Callable[[], datetime] = datetime.now):
+        self.fire = fire
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self._heap = []
+        self._queued: Dict[int, int] = {}  # plan id -> heap entries for it
+        self._cancelled = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+    
+    def schedule(self, plan_id: int, due_at: datetime):
+        with self._cond:
+            self._cancelled.discard(plan_id)
+            heapq.heappush(self._heap, (due_at, plan_id))
+            self._queued[plan_id] = self._queued.get(plan_id, 0) + 1
+            # Wake the thread in case this reminder is now the earliest
+            self._cond.notify()
+    
+    def cancel(self, plan_id: int):
+        """Drop a pending reminder; its heap entries are discarded lazily when they surface"""
+        with self._cond:
+            if plan_id in self._queued:
+                self._cancelled.add(plan_id)
+    
+    def pending_count(self) -> int:
+        with self._cond:
+            return sum(count for plan_id, count in self._queued.items() if plan_id not in self._cancelled)
+    
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='learnsphere-reminders', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+    
+    def _next_batch(self) -> Optional[List[int]]:
+        """Block until at least one reminder is due; None once stopped"""
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = (self._heap[0][0] - self.clock()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                
+                batch = []
+                now = self.clock()
+                while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                    _, plan_id = heapq.heappop(self._heap)
+                    remaining = self._queued.pop(plan_id) - 1
+                    if remaining:
+                        self._queued[plan_id] = remaining
+                    if plan_id not in self._cancelled:
+                        batch.append(plan_id)
+                    elif not remaining:
+                        self._cancelled.discard(plan_id)
+                if batch:
+                    return batch
+            return None
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.fire(batch)
+            except Exception as e:
+                logger.error(f"Reminder batch failed, retrying in {self.retry_delay}s: {str(e)}")
+                retry_at = self.clock() + timedelta(seconds=self.retry_delay)
+                for plan_id in batch:
+                    self.schedule(plan_id, retry_at)
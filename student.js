@@ -6,9 +6,7 @@ let finalTimer = null;
 let eventModal; // for Bootstrap modal instance
 let calendarDate = new Date();
 
-// IMPORTANT: Replace "" with your own Google AI Gemini API key for the AI Tutor to work.
-const GEMINI_API_KEY = "";
-let chatHistory = [];
+let conversationId = null; // tutor history is kept server-side under this id
 
 let notifications = [
     {id: 1, title: 'Welcome to LearnSphere! 🎉', message: 'Explore your dashboard and start your learning journey.', timestamp: new Date(Date.now() - 86400000), read: false},
@@ -178,8 +176,8 @@ document.addEventListener('DOMContentLoaded', async () => {
   showScreen('dashboard');
   updateStreakAndAchievements();
   updateNotifications();
-  checkReminders(); // Initial check
-  setInterval(checkReminders, 10000); // Check every 10 seconds for better responsiveness
+  connectEventStream(); // Server pushes notifications and study reminders
+  syncStudyPlans();
 
   // UTILITY FUNCTIONS
   function saveMe(){
@@ -364,43 +362,60 @@ document.addEventListener('DOMContentLoaded', async () => {
       const chatContainer = document.getElementById('chat-container');
       const chatInput = document.getElementById('chat-input');
       const userMessage = chatInput.value.trim();
-      if (!userMessage || !GEMINI_API_KEY) return;
+      if (!userMessage) return;
 
       chatContainer.innerHTML += `<div class="chat-bubble user">${userMessage}</div>`;
       chatInput.value = '';
       chatContainer.scrollTop = chatContainer.scrollHeight;
-      chatHistory.push({ role: "user", parts: [{ text: userMessage }] });
       
       chatContainer.innerHTML += `<div class="chat-bubble ai" id="loading-bubble"><span class="loading-spinner"></span> Thinking...</div>`;
       chatContainer.scrollTop = chatContainer.scrollHeight;
+      const bubble = document.getElementById('loading-bubble');
+      bubble.removeAttribute('id');
 
-      const systemPrompt = `You are "LearnSphere AI," an expert, encouraging AI tutor. Current Student: ${me.name}. Weak Topics: ${me.weak_topics.join(', ')}. Quiz Scores: ${JSON.stringify(me.quiz_scores)}. Be supportive, use Markdown for lists and bolding, and keep responses concise.`;
-      const apiUrl = `https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key=${GEMINI_API_KEY}`;
-      const payload = {
-          contents: chatHistory,
-          systemInstruction: { parts: [{ text: systemPrompt }] },
-          safetySettings: [{ category: 'HARM_CATEGORY_HARASSMENT', threshold: 'BLOCK_MEDIUM_AND_ABOVE' }],
-          generationConfig: { temperature: 0.7, maxOutputTokens: 2048 },
-      };
-
+      // The reply arrives as Server-Sent Events and is rendered as each chunk lands
+      let aiResponse = '';
       try {
-          const response = await fetch(apiUrl, {
+          const response = await fetch('http://localhost:5000/api/ai-tutor/chat/stream', {
               method: 'POST',
+              credentials: 'include',
               headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify(payload)
+              body: JSON.stringify({ message: userMessage, conversation_id: conversationId })
           });
+          if (response.status === 429 || response.status === 503) {
+              bubble.innerHTML = `The tutor is busy right now. Please try again in a moment.`;
+              return;
+          }
           if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-          const result = await response.json();
-          const candidate = result.candidates?.[0];
-          let aiResponse = "Sorry, I couldn't generate a response. Please try again.";
-          if (candidate?.content?.parts?.[0]?.text) {
-              aiResponse = candidate.content.parts[0].text.replace(/\n/g, '<br>');
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+              const { value, done } = await reader.read();
+              if (done) break;
+              buffer += decoder.decode(value, { stream: true });
+              const frames = buffer.split('\n\n');
+              buffer = frames.pop();
+              frames.forEach(frame => {
+                  const event = frame.match(/^event: (.*)$/m)?.[1];
+                  const data = frame.match(/^data: (.*)$/m)?.[1];
+                  if (event === 'chunk') {
+                      aiResponse += JSON.parse(data).text;
+                      bubble.innerHTML = aiResponse.replace(/\n/g, '<br>');
+                      chatContainer.scrollTop = chatContainer.scrollHeight;
+                  } else if (event === 'done') {
+                      conversationId = JSON.parse(data).conversation_id;
+                  } else if (event === 'error') {
+                      bubble.innerHTML += `<br><em>${JSON.parse(data).error}</em>`;
+                      conversationId = JSON.parse(data).conversation_id;
+                  }
+              });
           }
-          document.getElementById('loading-bubble').innerHTML = aiResponse;
-          chatHistory.push({ role: "model", parts: [{ text: aiResponse.replace(/<br>/g, '\n') }] });
+          if (!aiResponse) bubble.innerHTML = "Sorry, I couldn't generate a response. Please try again.";
       } catch (error) {
-          console.error("Error calling Gemini API:", error);
-          document.getElementById('loading-bubble').innerHTML = `I'm having connection issues. Please check the console for details.`;
+          console.error("Error calling AI tutor:", error);
+          bubble.innerHTML = `I'm having connection issues. Please check the console for details.`;
       }
       chatContainer.scrollTop = chatContainer.scrollHeight;
   }
@@ -550,35 +565,88 @@ document.addEventListener('DOMContentLoaded', async () => {
       const time = document.getElementById('event-time').value;
       const reminder = document.getElementById('event-reminder').checked;
       if (!title || !time) { alert('Please provide a title and time.'); return; }
-      me.study_plan.push({ id: Date.now(), date, time, title, reminder, notified: false });
+      const event = { id: Date.now(), date, time, title, reminder, notified: false };
+      me.study_plan.push(event);
       saveMe();
       renderCalendar();
       displayEventsForDay(date);
       eventModal.hide();
+
+      postStudyPlan(event)
+          .then(plan => {
+              if (plan) {
+                  event.id = plan.id;
+                  saveMe();
+              }
+          })
+          .catch(error => console.error('Failed to save study session:', error));
   }
-  
-  function checkReminders() {
-      if (!('Notification' in window) || Notification.permission !== 'granted') {
+
+  // Reminders are fired by the server, so it keeps its own copy of each session.
+  // Resolves to the stored plan, or null if the server rejected it
+  function postStudyPlan({ date, time, title, reminder }) {
+      return fetch('http://localhost:5000/api/study-plans', {
+          method: 'POST',
+          credentials: 'include',
+          headers: { 'Content-Type': 'application/json' },
+          // date and time are this browser's wall clock; due_at pins them to one moment in UTC
+          body: JSON.stringify({ date, time, title, reminder, due_at: new Date(`${date}T${time}`).toISOString() })
+      })
+          .then(response => response.ok ? response.json() : null)
+          .then(data => data && data.plan);
+  }
+
+  // The server's plans are the ones that get reminders. Sessions saved only in this
+  // browser (before plans were stored server-side, or while it was unreachable) are
+  // posted once and then replaced by the server's copy
+  async function syncStudyPlans() {
+      let serverPlans;
+      try {
+          const response = await fetch('http://localhost:5000/api/study-plans', { credentials: 'include' });
+          if (!response.ok) return;
+          serverPlans = (await response.json()).plans;
+      } catch (error) {
+          console.error('Failed to load study sessions:', error);
           return;
       }
+      const known = new Set(serverPlans.map(plan => plan.id));
+      const pending = me.study_plan.filter(event => !known.has(event.id) && !event.notified);
+      const kept = await Promise.all(pending.map(event => postStudyPlan(event).catch(error => {
+          // Still unreachable: keep the local copy and try again next time
+          console.error('Failed to save study session:', error);
+          return event;
+      })));
+      me.study_plan = serverPlans.concat(kept.filter(Boolean));
+      saveMe();
+      renderCalendar();
+  }
+  
+  function connectEventStream() {
+      if (!('EventSource' in window)) return;
 
-      const now = new Date();
-      me.study_plan.forEach(event => {
-          if (event.reminder && !event.notified) {
-              const eventDateTime = new Date(`${event.date}T${event.time}`);
-              const timeDiff = (eventDateTime - now) / 60000; // difference in minutes
-              
-              // Trigger if reminder is within 1 minute and event hasn't passed more than 5 minutes ago
-              if (timeDiff <= 1 && timeDiff > -5) { 
-                  new Notification('📚 Study Reminder!', {
-                      body: `Time for your study session: ${event.title}`,
-                      icon: 'https://img.icons8.com/plasticine/100/book.png',
-                      requireInteraction: true
-                  });
-                  addNotification('Study Reminder', `It's time to study: ${event.title} at ${event.time}`);
-                  event.notified = true;
-                  saveMe();
-              }
+      // EventSource reconnects on its own after network drops
+      const stream = new EventSource('http://localhost:5000/api/events/stream', { withCredentials: true });
+
+      stream.addEventListener('notification', (e) => {
+          const n = JSON.parse(e.data);
+          notifications.unshift({ id: n.id, title: n.title, message: n.message, timestamp: new Date(n.timestamp), read: n.read });
+          updateNotifications();
+          saveMe();
+      });
+
+      stream.addEventListener('reminder', (e) => {
+          const plan = JSON.parse(e.data);
+          const event = me.study_plan.find(ev => ev.id === plan.id);
+          if (event) {
+              event.notified = true;
+              saveMe();
+          }
+          if ('Notification' in window && Notification.permission === 'granted') {
+              new Notification('📚 Study Reminder!', {
+                  body: `Time for your study session: ${plan.title}`,
+                  icon: 'https://img.icons8.com/plasticine/100/book.png',
+                  requireInteraction: true
+              });
           }
       });
   }
@@ -591,6 +659,8 @@ document.addEventListener('DOMContentLoaded', async () => {
           if (confirm('Are you sure you want to delete this study session?')) {
               me.study_plan = me.study_plan.filter(event => event.id.toString() !== eventId);
               saveMe();
+              fetch(`http://localhost:5000/api/study-plans/${eventId}`, { method: 'DELETE', credentials: 'include' })
+                  .catch(error => console.error('Failed to delete study session:', error));
               renderCalendar(); 
               if (currentEvent) {
                   displayEventsForDay(currentEvent.date);
@@ -914,12 +984,19 @@ document.addEventListener('DOMContentLoaded', async () => {
       });
   }
 
-  function renderAITutor() {
+  async function renderAITutor() {
       const chatContainer = document.getElementById('chat-container');
       const chatInput = document.getElementById('chat-input');
       const sendButton = document.getElementById('chat-send-btn');
       
-      if (!GEMINI_API_KEY) {
+      let available = false;
+      try {
+          const health = await fetch('http://localhost:5000/api/health').then(r => r.json());
+          available = health.ai_service !== 'unavailable';
+      } catch (error) {
+          console.error('Health check failed:', error);
+      }
+      if (!available) {
           chatContainer.innerHTML = `<div class="chat-bubble ai">The AI Tutor is offline. A developer needs to add a Gemini API key.</div>`;
           chatInput.disabled = true;
           sendButton.disabled = true;
@@ -931,11 +1008,10 @@ document.addEventListener('DOMContentLoaded', async () => {
   }
 
   function initAITutor() {
-    chatHistory = []; // Reset history for the new session
+    conversationId = null; // Start a new conversation
     const chatContainer = document.getElementById('chat-container');
     const initialPrompt = `Hello, ${me.name}. I am your AI learning assistant. I see your current weak topics are: ${me.weak_topics.join(', ')}. How can I help you improve today?`;
     chatContainer.innerHTML = `<div class="chat-bubble ai">${initialPrompt}</div>`;
-    chatHistory.push({ role: "model", parts: [{ text: initialPrompt }] });
   }
   
   function renderProgressScreen() {
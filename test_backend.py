@@ -99,12 +99,25 @@ def test_backend():
         print_result("Get Leaderboard", success, response.json() if not success else None)
         if success:
             data = response.json()
-            print(f"   ✓ Leaderboard has {len(data['leaderboard'])} students\n")
+            print(f"   ✓ Leaderboard page has {len(data['leaderboard'])} of {data['total']} students")
+            if data.get('my_rank'):
+                print(f"   ✓ My rank: #{data['my_rank']['rank']}\n")
     except Exception as e:
         print_result("Get Leaderboard", False, str(e))
     
-    # Test 7: Test AI Tutor
-    print("7. Testing AI Tutor (if configured)...")
+    # Test 7: Unread Notification Count
+    print("7. Testing Unread Notification Count...")
+    try:
+        response = session.get(f"{BASE_URL}/api/notifications/unread-count")
+        success = response.status_code == 200
+        print_result("Unread Notification Count", success, response.json() if not success else None)
+        if success:
+            print(f"   ✓ {response.json()['unread']} unread notifications\n")
+    except Exception as e:
+        print_result("Unread Notification Count", False, str(e))
+    
+    # Test 8: Test AI Tutor
+    print("8. Testing AI Tutor (if configured)...")
     try:
         response = session.post(
             f"{BASE_URL}/api/ai-tutor/chat",
@@ -121,8 +134,8 @@ def test_backend():
     except Exception as e:
         print_result("AI Tutor", False, str(e))
     
-    # Test 8: Logout
-    print("8. Testing Logout...")
+    # Test 9: Logout
+    print("9. Testing Logout...")
     try:
         response = session.post(f"{BASE_URL}/api/auth/logout")
         success = response.status_code == 200
@@ -130,8 +143,8 @@ def test_backend():
     except Exception as e:
         print_result("Logout", False, str(e))
     
-    # Test 9: Login as Teacher
-    print("9. Testing Teacher Login...")
+    # Test 10: Login as Teacher
+    print("10. Testing Teacher Login...")
     try:
         response = session.post(
             f"{BASE_URL}/api/auth/login",
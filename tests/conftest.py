@@ -0,0 +1,52 @@
+"""The app on a throwaway SQLite database with a seeded class, shared by the app-level tests"""
+
+import pytest
+
+STUDENTS = 15
+
+
+@pytest.fixture(scope='session')
+def learnsphere(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'learnsphere.db'}")
+        patch.setenv('AI_CACHE_PATH', 'off')
+        patch.delenv('GEMINI_API_KEY', raising=False)
+        import app as learnsphere
+        learnsphere.app.config['TESTING'] = True
+        learnsphere.limiter.enabled = False
+        with learnsphere.app.app_context():
+            learnsphere.initialize_database()
+            seed_class(learnsphere)
+        yield learnsphere
+
+
+def seed_class(learnsphere):
+    """Enough students, notifications and announcements for an N+1 load to show up in query counts"""
+    db = learnsphere.db
+    teacher = learnsphere.User.query.filter_by(username='teacher').one()
+    for i in range(STUDENTS):
+        user = learnsphere.User(username=f'student{i}', role='student', name=f'Student {i}')
+        user.set_password('1234')
+        db.session.add(user)
+        db.session.flush()
+        profile = learnsphere.StudentProfile(user_id=user.id, weak_topics='[]', notes='{}', bookmarks='[]')
+        db.session.add(profile)
+        profile.set_quiz_scores({'Algebra': i / STUDENTS, 'Geometry': 0.5})
+        profile.set_completed_modules([f'module{m}' for m in range(i % 4)])
+        learnsphere.sync_leaderboard_entry(profile)
+        for n in range(3):
+            learnsphere.queue_notification(user.id, f'Note {n}', 'Keep going')
+    for n in range(3):
+        db.session.add(learnsphere.Announcement(teacher_id=teacher.id, title=f'News {n}', content='Read me'))
+    db.session.commit()
+
+
+@pytest.fixture
+def login(learnsphere):
+    """Test client signed in as `username` (every seeded password is 1234)"""
+    def login(username, role='student'):
+        client = learnsphere.app.test_client()
+        response = client.post('/api/auth/login', json={'username': username, 'password': '1234', 'role': role})
+        assert response.status_code == 200
+        return client
+    return login
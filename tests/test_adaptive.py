@@ -0,0 +1,69 @@
+"""Tests for adaptive.py"""
+
+import random
+
+from adaptive import (DifficultyIndex, ability_from_score, elo_update, expected_score,
+                      initial_difficulty, logit)
+
+
+def test_expected_score_is_even_at_equal_ratings():
+    assert expected_score(0.0, 0.0) == 0.5
+    assert expected_score(1.0, 0.0) > 0.5 > expected_score(0.0, 1.0)
+
+
+def test_logit_is_clamped():
+    assert logit(0.0) == logit(0.05)
+    assert logit(1.0) == logit(0.95)
+    assert abs(logit(0.5)) < 1e-9
+
+
+def test_initial_difficulty_defaults_to_medium():
+    assert initial_difficulty('easy') < initial_difficulty('medium') < initial_difficulty('hard')
+    assert initial_difficulty(None) == initial_difficulty('unknown') == 0.0
+
+
+def test_ability_from_score_matches_medium_success_rate():
+    assert ability_from_score(None) == 0.0
+    assert abs(expected_score(ability_from_score(0.8), 0.0) - 0.8) < 1e-9
+
+
+def test_elo_update_moves_ratings_towards_the_outcome():
+    ability, difficulty, offset = elo_update(0.0, 0.0, 0.0, True)
+    assert ability > 0 and difficulty < 0 and offset > 0
+    ability, difficulty, offset = elo_update(0.0, 0.0, 0.0, False)
+    assert ability < 0 and difficulty > 0 and offset < 0
+
+
+def test_elo_update_barely_moves_on_an_expected_result():
+    surprise = elo_update(0.0, 3.0, 0.0, True)[0]
+    expected = elo_update(3.0, 0.0, 0.0, True)[0] - 3.0
+    assert surprise > expected > 0
+
+
+def _index():
+    return DifficultyIndex(('Algebra', n, rating, f'q{n}') for n, rating in enumerate([-2, -1, 0, 1, 2, 3]))
+
+
+def test_pick_returns_the_nearest_ratings_easiest_first():
+    picked = _index().pick('Algebra', 1.1, 2, spread=1)
+    assert picked == ['q3', 'q4']
+
+
+def test_pick_draws_from_a_wider_window_for_variety():
+    seen = set()
+    for seed in range(20):
+        seen.update(_index().pick('Algebra', 0.1, 2, spread=2, rng=random.Random(seed)))
+    assert seen == {'q1', 'q2', 'q3', 'q4'}
+
+
+def test_pick_skips_keys_while_enough_remain():
+    assert _index().pick('Algebra', 0.1, 2, skip={2, 3}, spread=1) == ['q1', 'q4']
+    # Falls back to skipped questions rather than serving too few
+    assert len(_index().pick('Algebra', 0.0, 6, skip={0, 1, 2})) == 6
+
+
+def test_pick_handles_unknown_topics_and_short_pools():
+    index = _index()
+    assert index.pick('Biology', 0.0, 3) == []
+    assert len(index.pick('Algebra', 10.0, 10)) == 6
+    assert len(index) == 6
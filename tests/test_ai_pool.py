@@ -0,0 +1,122 @@
+"""Tests for ai_pool.py"""
+
+import threading
+
+import pytest
+
+from ai_pool import AIPool, AIPoolBusy, fit_lanes
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+
+
+def test_run_returns_the_result_and_frees_the_slot():
+    pool = AIPool({'tutor': 1})
+    assert pool.run('tutor', lambda a, b=0: a + b, 2, b=3) == 5
+    assert pool.run('tutor', lambda: 'again') == 'again'
+    stats = pool.stats()['tutor']
+    assert stats['running'] == 0 and stats['rejected'] == 0
+
+
+def test_run_propagates_exceptions():
+    pool = AIPool({'tutor': 1})
+    
+    def fail():
+        raise ValueError('bad prompt')
+    
+    with pytest.raises(ValueError):
+        pool.run('tutor', fail)
+    assert pool.stats()['tutor']['running'] == 0
+
+
+def test_call_timeout_answers_504():
+    pool = AIPool({'tutor': 1}, call_timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(AIPoolBusy) as busy:
+        pool.run('tutor', release.wait, 2)
+    assert busy.value.status == 504
+    assert pool.stats()['tutor']['timed_out'] == 1
+    release.set()
+
+
+def test_full_lane_answers_503_then_429():
+    pool = AIPool({'tutor': 1}, queue_factor=1, queue_timeout=0.05)
+    lane = pool.acquire('tutor')
+    try:
+        with pytest.raises(AIPoolBusy) as busy:
+            pool.acquire('tutor')
+        assert busy.value.status == 503
+        
+        # Fill the wait list, then the next request is turned away at once
+        waiter = threading.Thread(target=lambda: pytest.raises(AIPoolBusy, pool.acquire, 'tutor'))
+        pool.queue_timeout = 0.5
+        waiter.start()
+        while pool.stats()['tutor']['waiting'] == 0:
+            pass
+        with pytest.raises(AIPoolBusy) as busy:
+            pool.acquire('tutor')
+        assert busy.value.status == 429
+        waiter.join()
+    finally:
+        pool.release(lane)
+
+
+def test_lanes_are_independent():
+    pool = AIPool({'tutor': 1, 'analyze': 1}, queue_timeout=0.05)
+    lane = pool.acquire('tutor')
+    try:
+        assert pool.run('analyze', lambda: 'ok') == 'ok'
+    finally:
+        pool.release(lane)
+
+
+def test_run_waiting_outlasts_the_queue_timeout():
+    pool = AIPool({'bulk': 1}, queue_timeout=0.01)
+    lane = pool.acquire('bulk')
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(pool.run_waiting('bulk', lambda: 'done')))
+    waiter.start()
+    while pool.stats()['bulk']['waiting'] == 0:
+        pass
+    pool.release(lane)
+    waiter.join()
+    assert results == ['done']
+    stats = pool.stats()['bulk']
+    assert stats['waiting'] == 0 and stats['rejected'] == 0 and stats['timed_out'] == 0
+
+
+def test_fit_lanes_keeps_limits_that_fit():
+    assert fit_lanes({'tutor': 8, 'analyze': 4}, 12) == {'tutor': 8, 'analyze': 4}
+
+
+def test_fit_lanes_scales_down_proportionally():
+    fitted = fit_lanes({'tutor': 8, 'generate_questions': 2, 'analyze': 4}, 5)
+    assert sum(fitted.values()) <= 5
+    assert fitted['tutor'] >= fitted['analyze'] >= fitted['generate_questions'] >= 1
+
+
+def test_fit_lanes_needs_a_slot_per_lane():
+    with pytest.raises(ValueError):
+        fit_lanes({'tutor': 8, 'generate_questions': 2, 'analyze': 4}, 2)
+
+
+def test_lanes_leave_most_request_slots_free():
+    pool = AIPool({'tutor': 8, 'generate_questions': 2, 'analyze': 4}, request_slots=32)
+    held = sum(lane.concurrency + lane.max_waiting for lane in pool.lanes.values())
+    assert held <= 16
+    # Under gevent a worker holds far more requests, and the configured limits stand
+    pool = AIPool({'tutor': 8, 'generate_questions': 2, 'analyze': 4}, request_slots=1000)
+    assert pool.stats()['tutor']['concurrency'] == 8
+
+
+def test_hanging_calls_open_the_circuit():
+    breaker = CircuitBreaker('tutor', window=3, min_calls=3, slow_call_seconds=0.01)
+    pool = AIPool({'tutor': 4}, call_timeout=0.05, on_timeout=lambda lane: breaker.expire_hung())
+    release = threading.Event()
+    try:
+        for _ in range(3):
+            with pytest.raises(AIPoolBusy):
+                pool.run('tutor', breaker.call, release.wait)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            pool.run('tutor', breaker.call, lambda: 'ok')
+    finally:
+        release.set()
@@ -0,0 +1,78 @@
+"""Tests for ai_service.py"""
+
+import json
+
+from ai_backends import AIBackend, StubBackend
+from ai_cache import ResponseCache
+from ai_service import AIService
+from prompts import NAME_TOKEN_LIMIT, truncate_text
+
+
+class ScriptedBackend(AIBackend):
+    """Answers generate() with the stub's questions, keeping only the first `keep`"""
+    
+    name = 'scripted'
+    
+    def __init__(self, keep=None):
+        self.keep = keep
+        self.calls = 0
+    
+    def generate(self, prompt, task, params=None):
+        self.calls += 1
+        questions = json.loads(StubBackend().generate(prompt, task, params))
+        return json.dumps(questions[:self.keep])
+
+
+class EchoBackend(AIBackend):
+    """Answers a batch with one question per spec, naming topics as the prompt showed them"""
+    
+    name = 'echo'
+    
+    def generate(self, prompt, task, params=None):
+        return json.dumps([{
+            'topic': truncate_text(spec['topic'], NAME_TOKEN_LIMIT),
+            'question': f"About {spec['topic'][:20]}?",
+            'options': ['a', 'b', 'c'],
+            'correct_answer': 'a'
+        } for spec in params['specs']])
+
+
+def make_service(tmp_path, backend):
+    return AIService(api_key='test', cache=ResponseCache(str(tmp_path / 'cache.db')), backend=backend)
+
+
+def test_complete_generations_are_cached(tmp_path):
+    backend = ScriptedBackend()
+    service = make_service(tmp_path, backend)
+    assert len(service.generate_quiz_questions('Algebra', count=3)) == 3
+    assert len(service.generate_quiz_questions('Algebra', count=3)) == 3
+    assert backend.calls == 1
+
+
+def test_short_generations_are_not_cached(tmp_path):
+    service = make_service(tmp_path, ScriptedBackend(keep=2))
+    assert len(service.generate_quiz_questions('Algebra', count=3)) == 2
+    assert service.cached_quiz_questions('Algebra', count=3) is None
+
+
+def test_short_batches_are_not_cached(tmp_path):
+    specs = [{'topic': 'Algebra', 'difficulty': 'easy', 'count': 2},
+             {'topic': 'Geometry', 'difficulty': 'hard', 'count': 2}]
+    backend = ScriptedBackend(keep=3)
+    service = make_service(tmp_path, backend)
+    assert len(service.generate_question_batch(specs)) == 3
+    service.generate_question_batch(specs)
+    assert backend.calls == 2
+    
+    backend.keep = None
+    assert len(service.generate_question_batch(specs)) == 4
+    service.generate_question_batch(specs)
+    assert backend.calls == 3
+
+
+def test_batch_questions_match_truncated_topics_without_a_difficulty(tmp_path):
+    long_topic = 'Thermodynamics ' * 30
+    specs = [{'topic': 'Algebra', 'difficulty': 'easy', 'count': 1},
+             {'topic': long_topic, 'difficulty': 'hard', 'count': 1}]
+    questions = make_service(tmp_path, EchoBackend()).generate_question_batch(specs)
+    assert [(q['topic'], q['difficulty']) for q in questions] == [('Algebra', 'easy'), (long_topic, 'hard')]
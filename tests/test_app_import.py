@@ -0,0 +1,15 @@
+"""Importing the app must not load the slow Gemini SDK"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_app_leaves_the_gemini_sdk_unloaded(tmp_path):
+    env = dict(os.environ, GEMINI_API_KEY='test-key', AI_CACHE_PATH='off',
+               DATABASE_URL=f"sqlite:///{tmp_path / 'learnsphere.db'}")
+    check = "import sys, app; assert 'google.generativeai' not in sys.modules, 'SDK imported at startup'"
+    result = subprocess.run([sys.executable, '-c', check], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
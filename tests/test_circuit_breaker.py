@@ -0,0 +1,133 @@
+"""Tests for circuit_breaker.py"""
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def fail():
+    raise RuntimeError('backend down')
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=4, min_calls=4, base_backoff=10, max_backoff=100, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker('test', **options)
+
+
+def test_stays_closed_below_the_failure_threshold():
+    breaker = make_breaker(FakeClock())
+    for fn in (fail, lambda: 'ok', lambda: 'ok', lambda: 'ok'):
+        try:
+            breaker.call(fn)
+        except RuntimeError:
+            pass
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_failure_rate_and_fails_fast():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+    assert 5 <= breaker.retry_after() <= 10
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+
+
+def test_opens_on_slow_calls():
+    clock = FakeClock()
+    breaker = make_breaker(clock, slow_call_seconds=2)
+    
+    def slow():
+        clock.now += 3
+        return 'late'
+    
+    for _ in range(4):
+        assert breaker.call(slow) == 'late'
+    assert breaker.state == OPEN
+    assert breaker.last_trip_reason.startswith('slow call rate')
+
+
+def test_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    
+    clock.now += 10
+    probe = breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(True, 0, probe)
+    assert breaker.state == OPEN and breaker.trips == 2
+    
+    clock.now += 20
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED and breaker.trips == 0
+
+
+def test_calls_from_before_the_trip_do_not_decide_the_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    stale = breaker.allow()
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    
+    clock.now += 10
+    probe = breaker.allow()
+    breaker.record(False, 0, stale)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(True, 0, probe)
+    assert breaker.state == OPEN and breaker.last_trip_reason == 'probe failed'
+
+
+def test_backoff_grows_and_is_capped():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1, window=1, half_open_probes=1)
+    waits = []
+    for _ in range(6):
+        clock.now += 1000
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+        waits.append(breaker.opened_until - clock.now)
+    assert all(wait <= 100 for wait in waits)
+    assert waits[-1] >= 50
+
+
+def test_snapshot():
+    breaker = make_breaker(FakeClock())
+    breaker.call(lambda: 'ok')
+    snapshot = breaker.snapshot()
+    assert snapshot['state'] == CLOSED and snapshot['recent_calls'] == 1 and snapshot['retry_after'] is None
+
+
+def test_hung_calls_count_as_failures_once():
+    clock = FakeClock()
+    breaker = make_breaker(clock, slow_call_seconds=5)
+    tickets = [breaker.allow() for _ in range(4)]
+    clock.now += 4
+    assert breaker.expire_hung() == 0
+    clock.now += 1
+    assert breaker.expire_hung() == 4
+    assert breaker.state == OPEN
+    # The calls finishing late don't count again
+    for ticket in tickets:
+        breaker.record(False, 6, ticket)
+    assert breaker.snapshot()['recent_calls'] == 0
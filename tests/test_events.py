@@ -0,0 +1,77 @@
+"""Tests for events.py"""
+
+from events import EventBroker, EventRelay
+
+
+class Store:
+    """Stand-in for the stream_events table: only committed rows are visible"""
+    
+    def __init__(self):
+        self.rows = {}
+    
+    def commit(self, event_id, user_id, event_type):
+        self.rows[event_id] = (event_id, user_id, None, event_type, {'id': event_id})
+    
+    def fetch(self, after_id, missing):
+        return [row for event_id, row in sorted(self.rows.items()) if event_id > after_id or event_id in missing]
+    
+    def latest(self):
+        return max(self.rows, default=0)
+
+
+def make_relay(store, now):
+    broker = EventBroker()
+    relay = EventRelay(store.fetch, broker.deliver, store.latest, clock=lambda: now[0], settle_seconds=30)
+    return broker, relay
+
+
+def drain(subscription):
+    events = []
+    while True:
+        event = subscription.get(timeout=0)
+        if event is None:
+            return events
+        events.append(event[1]['id'])
+
+
+def test_relay_delivers_only_events_stored_after_it_started():
+    store = Store()
+    store.commit(1, 7, 'notification')
+    broker, relay = make_relay(store, [0])
+    relay.poll()
+    subscription = broker.subscribe(7, 'student')
+    store.commit(2, 7, 'notification')
+    store.commit(3, 8, 'notification')
+    assert relay.poll() == 2
+    assert drain(subscription) == [2]
+    assert relay.poll() == 0
+
+
+def test_relay_picks_up_ids_committed_out_of_order():
+    store = Store()
+    now = [0]
+    broker, relay = make_relay(store, now)
+    relay.poll()
+    subscription = broker.subscribe(7, 'student')
+    store.commit(2, 7, 'notification')
+    relay.poll()
+    now[0] = 5
+    store.commit(1, 7, 'reminder')
+    relay.poll()
+    assert drain(subscription) == [2, 1]
+    
+    # An id that never commits (a rolled-back insert) is given up on once it has settled
+    store.commit(4, 7, 'notification')
+    relay.poll()
+    now[0] = 40
+    relay.poll()
+    assert relay._gaps == {}
+
+
+def test_broadcasts_reach_every_stream_of_the_role():
+    broker = EventBroker()
+    student = broker.subscribe(1, 'student')
+    teacher = broker.subscribe(2, 'teacher')
+    broker.deliver(None, 'student', 'notification', {'id': 9})
+    assert drain(student) == [9]
+    assert drain(teacher) == []
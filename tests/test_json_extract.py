@@ -0,0 +1,69 @@
+"""Tests for json_extract.py"""
+
+from json_extract import Schema, parse_items, parse_object
+
+QUESTION = Schema(required={'question': str, 'options': list}, optional={'hint': str},
+                  check=lambda q: None if len(q['options']) == 3 else 'needs 3 options')
+
+
+def test_parse_items_ignores_fences_and_prose():
+    text = 'Here you go:\n```json\n[{"a": 1}, {"a": 2}]\n```\nGood luck!'
+    assert parse_items(text) == ([{'a': 1}, {'a': 2}], [])
+
+
+def test_parse_items_skips_malformed_elements():
+    value, errors = parse_items('[{"a": 1}, {"a": oops}, {"a": 3}]')
+    assert value == [{'a': 1}, {'a': 3}]
+    assert len(errors) == 1 and errors[0].startswith('item 1: invalid JSON')
+
+
+def test_parse_items_skips_stray_closing_braces():
+    value, errors = parse_items('[{"a": 1}, }, {"b": 2}]')
+    assert value == [{'a': 1}, {'b': 2}]
+    assert len(errors) == 1 and errors[0].startswith('item 1: invalid JSON')
+    assert parse_items('[1, 2}').value == [1, 2]
+    assert parse_items('[{"a": 1} }').value == [{'a': 1}]
+    assert parse_items('```json\n[{"a": 1}}\n]\n```').value == [{'a': 1}]
+
+
+def test_parse_items_keeps_complete_elements_of_a_cut_off_array():
+    value, errors = parse_items('[{"a": 1}, {"a": 2}, {"a": "trunc')
+    assert value == [{'a': 1}, {'a': 2}]
+    assert errors[0].startswith('item 2: cut off')
+
+
+def test_parse_items_unwraps_an_object():
+    assert parse_items('{"questions": [{"a": 1}]}').value == [{'a': 1}]
+    assert parse_items('{"a": 1}').value == [{'a': 1}]
+
+
+def test_parse_items_reports_a_missing_array():
+    assert parse_items('no json here') == ([], ['no JSON array found in response'])
+    assert parse_items(None).value == []
+
+
+def test_parse_items_validates_with_a_schema():
+    text = ('[{"question": "Q1", "options": ["a", "b", "c"], "hint": 5},'
+            ' {"question": "Q2", "options": ["a"]},'
+            ' {"options": ["a", "b", "c"]}]')
+    value, errors = parse_items(text, QUESTION)
+    assert value == [{'question': 'Q1', 'options': ['a', 'b', 'c']}]
+    assert len(errors) == 3
+    assert 'kept the rest' in errors[0]
+
+
+def test_parse_object_repairs_a_cut_off_object():
+    value, errors = parse_object('{"overall": "good", "recommendations": ["a", "b"], "focus": ["alg')
+    assert value == {'overall': 'good', 'recommendations': ['a', 'b']}
+    assert errors and 'cut off' in errors[0]
+
+
+def test_parse_object_without_an_object():
+    assert parse_object('nothing') == (None, ['no JSON object found in response'])
+
+
+def test_parse_object_drops_fields_of_the_wrong_type():
+    schema = Schema(optional={'tips': list, 'summary': str})
+    value, errors = parse_object('{"tips": "not a list", "summary": "ok", "extra": 1}', schema)
+    assert value == {'summary': 'ok', 'extra': 1}
+    assert errors == ['tips has the wrong type (str)']
@@ -0,0 +1,29 @@
+"""Leaderboard ranks and paging over LeaderboardEntry"""
+
+PAGE = 4
+
+
+def test_pages_and_ranks_follow_score_then_streak_then_id(learnsphere, login):
+    client = login('student1')
+    LeaderboardEntry = learnsphere.LeaderboardEntry
+    with learnsphere.app.app_context():
+        # Ties on score, and on score and streak, so every tie-break is exercised
+        ids = {}
+        for username, streak in (('student0', 2), ('student1', 5), ('student2', 5)):
+            entry = LeaderboardEntry.query.filter_by(username=username).one()
+            entry.score, entry.streak = 70, streak
+            ids[username] = entry.user_id
+        learnsphere.db.session.commit()
+        entries = LeaderboardEntry.query.all()
+        order = [e.user_id for e in sorted(entries, key=lambda e: (-e.score, -e.streak, e.user_id))]
+        assert [learnsphere.get_leaderboard_rank(e) for e in sorted(entries, key=lambda e: order.index(e.user_id))] \
+            == list(range(1, len(order) + 1))
+    assert order.index(ids['student1']) < order.index(ids['student2']) < order.index(ids['student0'])
+    
+    seen = []
+    for offset in range(0, len(order), PAGE):
+        page = client.get(f'/api/student/leaderboard?offset={offset}&limit={PAGE}').get_json()
+        assert page['total'] == len(order)
+        seen += [(row['rank'], row['id']) for row in page['leaderboard']]
+    assert seen == [(rank, user_id) for rank, user_id in enumerate(order, 1)]
+    assert page['my_rank']['rank'] == order.index(ids['student1']) + 1
@@ -0,0 +1,42 @@
+"""Query budgets of the hot endpoints, run against the app on a throwaway SQLite database"""
+
+from query_helpers import DEFAULT_QUERY_BUDGET
+
+
+def assert_within_budget(learnsphere, response, endpoint):
+    """Overruns of views that commit are only logged, so check the reported count as well as the status"""
+    assert response.status_code == 200, response.get_json()
+    budget = getattr(learnsphere.app.view_functions[endpoint], 'query_budget', None) or DEFAULT_QUERY_BUDGET
+    assert int(response.headers['X-Query-Count']) <= budget
+
+
+def test_leaderboard(learnsphere, login):
+    client = login('student3')
+    for query in ('', '?offset=5&limit=5'):
+        assert_within_budget(learnsphere, client.get(f'/api/student/leaderboard{query}'), 'get_leaderboard')
+
+
+def test_notifications(learnsphere, login):
+    client = login('student4')
+    response = client.get('/api/notifications?limit=2')
+    assert_within_budget(learnsphere, response, 'get_notifications')
+    cursor = response.get_json()['next_cursor']
+    assert_within_budget(learnsphere, client.get(f'/api/notifications?before={cursor}'), 'get_notifications')
+    assert_within_budget(learnsphere, client.get('/api/notifications/unread-count'),
+                         'get_notifications_unread_count')
+
+
+def test_analytics(learnsphere, login):
+    client = login('teacher', 'teacher')
+    assert_within_budget(learnsphere, client.get('/api/teacher/analytics'), 'get_analytics')
+
+
+def test_submit_quiz(learnsphere, login):
+    client = login('student5')
+    with learnsphere.app.app_context():
+        questions = learnsphere.QuizQuestion.query.limit(10).all()
+        answers = [{'question_id': q.id, 'answer': q.correct_answer} for q in questions]
+    # The first quiz inserts topic scores, mastery rows and badges; the second updates them
+    for _ in range(2):
+        response = client.post('/api/student/submit-quiz', json={'answers': answers, 'completed_modules': ['module9']})
+        assert_within_budget(learnsphere, response, 'submit_quiz')
@@ -0,0 +1,65 @@
+"""Tests for question_dedup.py"""
+
+from question_dedup import MinHasher, QuestionIndex, normalize_question, question_hash, shingles
+
+
+def test_normalize_ignores_case_width_and_punctuation():
+    assert normalize_question('What is  2x + 3?') == normalize_question('what is 2X + 3')
+    assert normalize_question('x²') == normalize_question('X2')
+
+
+def test_normalize_keeps_operators():
+    assert question_hash('Solve 2x + 3 = 7') != question_hash('Solve 2x - 3 = 7')
+
+
+def test_shingles_of_short_text_is_the_whole_text():
+    assert shingles('a b') == {'a b'}
+    assert shingles('a b c d') == {'a b c', 'b c d'}
+
+
+def test_signatures_are_deterministic():
+    items = shingles(normalize_question('What is the derivative of x squared?'))
+    assert MinHasher(seed=3).signature(items) == MinHasher(seed=3).signature(items)
+
+
+def test_find_exact_duplicate():
+    index = QuestionIndex()
+    index.add(1, 'Algebra', 'Solve: 2x + 5 = 15')
+    assert index.find('Algebra', 'solve 2X + 5 = 15!') == (1, 1.0)
+
+
+def test_find_is_scoped_to_the_topic():
+    index = QuestionIndex()
+    index.add(1, 'Algebra', 'Solve: 2x + 5 = 15')
+    assert index.find('Geometry', 'Solve: 2x + 5 = 15') is None
+
+
+def test_find_near_duplicate():
+    index = QuestionIndex(threshold=0.5)
+    index.add(1, 'Biology', 'Which organelle in a plant cell is responsible for producing energy through photosynthesis?')
+    match = index.find('Biology', 'Which organelle in a plant cell is responsible for producing energy via photosynthesis?')
+    assert match is not None and match[0] == 1 and 0.5 <= match[1] < 1.0
+
+
+def test_find_ignores_unrelated_and_excluded_questions():
+    index = QuestionIndex()
+    index.add(1, 'Physics', 'What is the unit of electrical resistance?')
+    assert index.find('Physics', 'How fast does light travel in a vacuum?') is None
+    assert index.find('Physics', 'What is the unit of electrical resistance?', exclude=1) is None
+    assert len(index) == 1
+
+
+def test_remove_and_replace_questions():
+    index = QuestionIndex()
+    index.add(1, 'Physics', 'What is the unit of electrical resistance?')
+    index.add(2, 'Physics', 'What is the unit of electrical resistance?')
+    index.remove(1)
+    assert index.find('Physics', 'What is the unit of electrical resistance?') == (2, 1.0)
+    # Re-adding a key replaces its old text and topic
+    index.add(2, 'Physics', 'How fast does light travel in a vacuum?')
+    assert index.find('Physics', 'What is the unit of electrical resistance?') is None
+    assert index.find('Physics', 'How fast does light travel in a vacuum?') == (2, 1.0)
+    index.remove(2)
+    index.remove(3)
+    assert len(index) == 0 and not index.hashes and not index.buckets
+
@@ -0,0 +1,124 @@
+"""Tests for scheduler.py"""
+
+import threading
+from datetime import datetime, timedelta
+
+from scheduler import ReminderScheduler
+
+
+class Recorder:
+    def __init__(self, expected):
+        self.batches = []
+        self.expected = expected
+        self.done = threading.Event()
+    
+    def __call__(self, plan_ids):
+        self.batches.append(plan_ids)
+        if sum(len(batch) for batch in self.batches) >= self.expected:
+            self.done.set()
+
+
+def test_fires_due_reminders_in_due_order():
+    fired = Recorder(3)
+    scheduler = ReminderScheduler(fired)
+    past = datetime.now() - timedelta(minutes=1)
+    scheduler.schedule(2, past + timedelta(seconds=2))
+    scheduler.schedule(1, past)
+    scheduler.schedule(3, past + timedelta(seconds=5))
+    scheduler.start()
+    try:
+        assert fired.done.wait(2)
+    finally:
+        scheduler.stop()
+    assert fired.batches == [[1, 2, 3]]
+
+
+def test_batches_are_capped():
+    fired = Recorder(5)
+    scheduler = ReminderScheduler(fired, batch_size=2)
+    for plan_id in range(5):
+        scheduler.schedule(plan_id, datetime.now() - timedelta(seconds=1))
+    scheduler.start()
+    try:
+        assert fired.done.wait(2)
+    finally:
+        scheduler.stop()
+    assert [len(batch) for batch in fired.batches] == [2, 2, 1]
+
+
+def test_wakes_for_a_reminder_added_while_sleeping():
+    fired = Recorder(1)
+    scheduler = ReminderScheduler(fired)
+    scheduler.schedule(1, datetime.now() + timedelta(hours=1))
+    scheduler.start()
+    try:
+        scheduler.schedule(2, datetime.now())
+        assert fired.done.wait(2)
+    finally:
+        scheduler.stop()
+    assert fired.batches == [[2]]
+
+
+def test_cancelled_reminders_do_not_fire():
+    fired = Recorder(1)
+    scheduler = ReminderScheduler(fired)
+    past = datetime.now() - timedelta(seconds=1)
+    scheduler.schedule(1, past)
+    scheduler.schedule(2, past)
+    scheduler.cancel(1)
+    assert scheduler.pending_count() == 1
+    scheduler.start()
+    try:
+        assert fired.done.wait(2)
+    finally:
+        scheduler.stop()
+    assert fired.batches == [[2]]
+    assert scheduler.pending_count() == 0
+
+
+def test_failed_batches_are_retried():
+    attempts = []
+    done = threading.Event()
+    
+    def fire(plan_ids):
+        attempts.append(plan_ids)
+        if len(attempts) == 1:
+            raise RuntimeError('database is locked')
+        done.set()
+    
+    scheduler = ReminderScheduler(fire, retry_delay=0)
+    scheduler.schedule(7, datetime.now())
+    scheduler.start()
+    try:
+        assert done.wait(2)
+    finally:
+        scheduler.stop()
+    assert attempts == [[7], [7]]
+
+
+def test_cancelling_an_unscheduled_plan_is_a_no_op():
+    scheduler = ReminderScheduler(lambda plan_ids: None)
+    scheduler.schedule(1, datetime.now() + timedelta(hours=1))
+    scheduler.cancel(2)
+    scheduler.cancel(2)
+    assert scheduler.pending_count() == 1
+    assert scheduler._cancelled == set()
+
+
+def test_cancel_marks_are_dropped_once_the_entries_surface():
+    fired = Recorder(1)
+    scheduler = ReminderScheduler(fired)
+    past = datetime.now() - timedelta(seconds=1)
+    scheduler.schedule(1, past)
+    scheduler.schedule(1, past)
+    scheduler.cancel(1)
+    scheduler.schedule(2, past)
+    assert scheduler.pending_count() == 1
+    scheduler.start()
+    try:
+        assert fired.done.wait(2)
+    finally:
+        scheduler.stop()
+    assert fired.batches == [[2]]
+    assert scheduler._cancelled == set() and scheduler._queued == {}
+    assert scheduler.pending_count() == 0